@@ -0,0 +1,9 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# yunetas.main settles YUNETAS_BASE when it is imported, and exits without one.
+if not os.path.isdir(os.environ.get("YUNETAS_BASE", "")):
+    os.environ["YUNETAS_BASE"] = tempfile.mkdtemp(prefix="yunetas-base-")
+    atexit.register(shutil.rmtree, os.environ["YUNETAS_BASE"], True)
@@ -0,0 +1,189 @@
+import json
+import os
+import random
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from yunetas.agent_tools import (
+    agent_client, set_start_priorities, sync_binaries, sync_configs,
+)
+from yunetas.agent_tools.agent_client import (
+    AgentSession, LeadingJSONDecoder, parse_leading_json, report_ready,
+    wait_yunos_ready,
+)
+
+FOOTER = "\n\033[32m*list-binaries\033[0m\n"
+
+
+def decode_in_pieces(text, sizes, rnd):
+    decoder = LeadingJSONDecoder()
+    i = 0
+    while i < len(text):
+        n = rnd.choice(sizes)
+        decoder.feed(text[i:i + n])
+        i += n
+    return decoder.close()
+
+
+@pytest.mark.parametrize("payload", [
+    [1, 2.5, -3e4, True, None, "a]b", {"x": [1, {"y": "}"}]}],
+    {"k": "v", "n": [1, 2]},
+    [],
+    [12345678901234567890],
+])
+def test_decoder_any_split(payload):
+    text = "\n" + json.dumps(payload) + FOOTER
+    rnd = random.Random(1)
+    for _ in range(200):
+        assert decode_in_pieces(text, [1, 2, 3, 7, 50], rnd) == payload
+
+
+def test_decoder_skips_ansi_lead_in():
+    text = "\n\033[33mhello\033[0m\n[ {\"a\": 1}, 2 ]" + FOOTER
+    rnd = random.Random(2)
+    for _ in range(200):
+        assert decode_in_pieces(text, [1, 2, 5], rnd) == [{"a": 1}, 2]
+    assert parse_leading_json(text) == [{"a": 1}, 2]
+
+
+def test_decoder_strips_ansi_inside_the_payload():
+    text = "\n[{\"a\": \"\033[31mred\033[0m\"}, \033[1m2\033[0m, {\"b\": [3]}]" + FOOTER
+    payload = [{"a": "red"}, 2, {"b": [3]}]
+    rnd = random.Random(4)
+    for _ in range(200):
+        assert decode_in_pieces(text, [1, 2, 3, 5], rnd) == payload
+    assert parse_leading_json(text) == payload
+
+
+def test_decoder_error_offset_is_in_the_whole_output():
+    text = "\n\033[33mlead\033[0m\n[" + ", ".join(["1"] * 5000) + " 2]"
+    clean = "\nlead\n[" + ", ".join(["1"] * 5000) + " 2]"
+    rnd = random.Random(5)
+    for sizes in ([1, 7], [4096]):
+        with pytest.raises(json.JSONDecodeError) as info:
+            decode_in_pieces(text, sizes, rnd)
+        assert info.value.pos == clean.index(" 2]") + 1
+        assert info.value.doc == clean
+
+
+def test_decoder_large_single_value():
+    # One object, and one array element, each far larger than a piece.
+    rows = [{"id": "x%d" % i, "zcontent": "a" * 100} for i in range(5000)]
+    rnd = random.Random(3)
+    assert decode_in_pieces("\n" + json.dumps({"rows": rows}), [4096], rnd) == {"rows": rows}
+    assert decode_in_pieces("\n[" + json.dumps({"rows": rows}) + "]", [4096], rnd) == [{"rows": rows}]
+
+
+def test_decoder_bad_delimiter_told_at_close():
+    decoder = LeadingJSONDecoder()
+    decoder.feed("[1 2")
+    decoder.feed(", 3]")
+    with pytest.raises(json.JSONDecodeError):
+        decoder.close()
+
+
+def fake_ycommand(tmp_path, body):
+    path = tmp_path / "ycommand"
+    path.write_text("#!/bin/sh\n" + body)
+    os.chmod(str(path), stat.S_IRWXU)
+    return str(path)
+
+
+def test_query_error_carries_exit_code_and_stderr(tmp_path):
+    ycommand = fake_ycommand(
+        tmp_path, "echo 'not json'\necho 'connection refused' >&2\nexit 3\n")
+    session = AgentSession(ycommand)
+    with pytest.raises(json.JSONDecodeError) as info:
+        session.query("*list-binaries")
+    assert info.value.returncode == 3
+    assert info.value.stderr == "connection refused\n"
+    assert info.value.doc == "not json\n"
+
+
+def test_query_strips_ansi_inside_the_payload(tmp_path):
+    ycommand = fake_ycommand(
+        tmp_path, "printf '\\n[{\"s\": \"\\033[32mok\\033[0m\"}]\\n'\n")
+    assert AgentSession(ycommand).query("*list-yunos") == [{"s": "ok"}]
+
+
+def test_query_check_rejects_non_zero_exit(tmp_path):
+    ycommand = fake_ycommand(
+        tmp_path, "echo '[{\"name\": \"s1\", \"active\": true}]'\necho 'denied' >&2\nexit 1\n")
+    session = AgentSession(ycommand)
+    assert session.query("*snaps") == [{"name": "s1", "active": True}]
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        session.query("*snaps", check=True)
+    assert info.value.returncode == 1
+    assert info.value.stderr == "denied\n"
+
+
+class ScriptedSession(AgentSession):
+    """An AgentSession whose queries answer from `answers` in turn; None fails."""
+
+    def __init__(self, answers):
+        AgentSession.__init__(self, "ycommand")
+        self.answers = list(answers)
+
+    def query(self, cmd_str, timeout=30, fresh=False, check=False):
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if answer is None:
+            raise subprocess.TimeoutExpired(cmd_str, timeout)
+        return answer
+
+
+@pytest.fixture
+def quick_poll(monkeypatch):
+    monkeypatch.setattr(agent_client, "POLL_FIRST", 0.001)
+    monkeypatch.setattr(agent_client, "POLL_MAX", 0.001)
+    monkeypatch.setattr(agent_client, "READY_SETTLE", 0.01)
+
+
+def yuno(running, playing=False):
+    return [{"id": "1", "yuno_running": running, "yuno_playing": playing}]
+
+
+def test_ready_survives_a_failed_poll(quick_poll):
+    session = ScriptedSession([yuno(True), None, yuno(True), None, yuno(True)])
+    state, _ = wait_yunos_ready(session, "*list-yunos", {"1": False}, timeout=2)
+    assert state == "ready"
+
+
+def test_ready_survives_a_missing_record(quick_poll):
+    session = ScriptedSession([yuno(True), [], yuno(True)])
+    state, _ = wait_yunos_ready(session, "*list-yunos", {"1": False}, timeout=2)
+    assert state == "ready"
+
+
+def test_ready_reports_a_yuno_that_stops_again(quick_poll):
+    session = ScriptedSession([yuno(False), yuno(True), None, yuno(False)])
+    state, _ = wait_yunos_ready(session, "*list-yunos", {"1": False}, timeout=2)
+    assert state == "crashed"
+
+
+def test_ready_times_out_while_not_playing(quick_poll):
+    session = ScriptedSession([yuno(True, playing=False)])
+    state, _ = wait_yunos_ready(session, "*list-yunos", {"1": True}, timeout=0.1)
+    assert state == "timeout"
+
+
+def test_report_ready(capsys):
+    assert report_ready("y1", "ready", 1.34) is True
+    assert report_ready("y1", "crashed", 2.0) is False
+    assert report_ready("y1", "timeout", 30.0) is False
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == ["   y1 ready in 1.3s",
+                     "   ! y1 stopped again 2.0s after starting (crash loop?)",
+                     "   ! y1 not up after 30s"]
+
+
+@pytest.mark.parametrize("tool", [sync_binaries, sync_configs, set_start_priorities])
+def test_tools_run_as_scripts(tool, tmp_path):
+    # Outside the package: agent_client is imported from beside the script.
+    for argv in ([tool.__file__, "--help"], [sys.executable, tool.__file__, "--help"]):
+        res = subprocess.run(argv, cwd=str(tmp_path), stdin=subprocess.DEVNULL,
+                             capture_output=True, text=True)
+        assert res.returncode == 0, res.stderr
+        assert res.stdout.startswith("usage:")
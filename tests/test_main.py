@@ -0,0 +1,183 @@
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from yunetas import main
+from yunetas.agent_tools import sync_configs
+
+
+def test_run_agent_tool_exit_codes(monkeypatch, capsys):
+    argv = sys.argv
+
+    def fail(argv=None):
+        raise ValueError("listing went wrong")
+
+    monkeypatch.setattr(sync_configs, "main", fail)
+    assert main.run_agent_tool("sync_configs.py", ["-n"]) == 1
+    assert "listing went wrong" in capsys.readouterr().err
+
+    def leave(argv=None):
+        assert sys.argv == ["sync_configs.py"] + argv
+        sys.exit(2)
+
+    monkeypatch.setattr(sync_configs, "main", leave)
+    assert main.run_agent_tool("sync_configs.py", ["-n"]) == 2
+
+    monkeypatch.setattr(sync_configs, "main", lambda argv=None: None)
+    assert main.run_agent_tool("sync_configs.py", []) == 0
+    assert sys.argv is argv
+
+
+def project_with_hosts(tmp_path, hosts):
+    for h in hosts:
+        (tmp_path / "yunos" / "batches" / h).mkdir(parents=True)
+    return {"name": "p1", "path": str(tmp_path)}
+
+
+def test_interrupt_stops_the_config_push(tmp_path, monkeypatch):
+    proj = project_with_hosts(tmp_path, ["h1"])
+    other = project_with_hosts(tmp_path / "other", ["h1"])
+    pushed = []
+
+    def interrupted(argv=None):
+        pushed.append(argv[-1])
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(sync_configs, "main", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        main.push_configs([proj, other], "h1", None, [])
+    assert len(pushed) == 1
+
+    def on_signal(argv=None):
+        # What sync_configs' handler does after removing its secrets workdir.
+        pushed.append(argv[-1])
+        raise SystemExit(128 + signal.SIGINT)
+
+    del pushed[:]
+    monkeypatch.setattr(sync_configs, "main", on_signal)
+    with pytest.raises(SystemExit) as info:
+        main.push_configs([proj, other], "h1", None, [])
+    assert info.value.code == 130
+    assert len(pushed) == 1
+
+
+def test_configure_fingerprint_follows_the_generator(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "YUNETAS_BASE", str(tmp_path))
+    for name in main.CONFIGURE_ENV:
+        monkeypatch.delenv(name, raising=False)
+    (tmp_path / ".config").write_text("CONFIG_A=y\n")
+    build = tmp_path / "build"
+    build.mkdir()
+    (build / "Makefile").write_text("")
+    cmake = ["cmake", "-DCMAKE_BUILD_TYPE=Debug", ".."]
+    (build / main.CONFIGURE_FINGERPRINT).write_text(json.dumps(main.configure_fingerprint(cmake)))
+
+    def action(command=cmake):
+        return main.configure_action(build, main.configure_fingerprint(command))
+
+    assert action() == "skip"
+    assert action(["cmake", "-G", "Ninja"] + cmake[1:]) == "wipe"
+    monkeypatch.setenv("CMAKE_GENERATOR", "Ninja")
+    assert action() == "wipe"
+    monkeypatch.delenv("CMAKE_GENERATOR")
+    monkeypatch.setenv("CC", "clang")
+    assert action() == "wipe"
+    monkeypatch.delenv("CC")
+    assert action() == "skip"
+    (tmp_path / ".config").write_text("CONFIG_A=y\nCONFIG_B=2\n")
+    assert action() == "refresh"
+
+
+@pytest.fixture
+def sdk(tmp_path, monkeypatch):
+    base = tmp_path / "sdk"
+    (base / "outputs" / "include").mkdir(parents=True)
+    monkeypatch.setattr(main, "YUNETAS_BASE", str(base))
+    main.forget_sdk_output_stamps()
+    yield base
+    main.forget_sdk_output_stamps()
+
+
+def test_manifest_walks_a_source_directory_named_build(sdk, tmp_path):
+    d = tmp_path / "project"
+    (d / "src" / "build").mkdir(parents=True)
+    (d / "build").mkdir()
+    source = d / "src" / "build" / "gen.c"
+    source.write_text("int x;\n")
+    before = main.build_inputs_fingerprint(d)
+
+    (d / "build" / "gen.o").write_text("object")
+    assert main.build_inputs_fingerprint(d) == before
+    source.write_text("int xy;\n")
+    assert main.build_inputs_fingerprint(d) != before
+
+
+def test_manifest_follows_sources_and_sdk_outputs(sdk, tmp_path, monkeypatch):
+    d = tmp_path / "project"
+    (d / "build").mkdir(parents=True)
+    source = d / "main.c"
+    source.write_text("int main(void) { return 0; }\n")
+    assert not main.is_build_current(d)
+
+    monkeypatch.setattr(main, "settled_directories", [d])
+    main.record_build_manifests()
+    assert main.is_build_current(d)
+
+    source.write_text("int main(void) { return 1; }\n\n")
+    assert not main.is_build_current(d)
+    main.settled_directories.append(d)
+    main.record_build_manifests()
+    assert main.is_build_current(d)
+
+    (sdk / "outputs" / "include" / "yuneta_config.h").write_text("#define X 1\n")
+    main.forget_sdk_output_stamps()
+    assert not main.is_build_current(d)
+
+
+def test_build_graph_keeps_deps_and_cpu_budget(tmp_path, monkeypatch):
+    # a, then b c d side by side, then e.
+    names = "abcde"
+    deps = {"a": "", "b": "a", "c": "a", "d": "a", "e": "bcd"}
+    nodes = [{"name": n, "dir": tmp_path / n, "deps": {names.index(x) for x in deps[n]}}
+             for n in names]
+    lock = threading.Lock()
+    running = {}
+    finished = []
+    shares = {}
+
+    def run_captured(cmd, cwd):
+        name = cwd.parent.name
+        share = int(cmd[1][2:]) if cmd[1].startswith("-j") else 1
+        with lock:
+            assert set(deps[name]) <= set(finished)
+            running[name] = share
+            assert sum(running.values()) <= 4
+            shares[name] = share
+        time.sleep(0.05)
+        with lock:
+            del running[name]
+            finished.append(name)
+        return 0, ""
+
+    monkeypatch.setattr(main, "run_captured", run_captured)
+    monkeypatch.setattr(main, "driver_command", lambda build_dir, command: list(command))
+    assert main.run_build_graph(nodes, ["make", "install"], 4) == []
+    assert finished[0] == "a" and finished[-1] == "e"
+    assert shares == {"a": 4, "b": 2, "c": 1, "d": 1, "e": 4}
+
+
+def test_write_if_changed_keeps_the_mtime(tmp_path):
+    path = tmp_path / "yuneta_config.h"
+    assert main.write_if_changed(str(path), "#define A 1\n")
+    os.utime(str(path), ns=(10**18, 10**18))
+    assert not main.write_if_changed(str(path), "#define A 1\n")
+    assert path.stat().st_mtime_ns == 10**18
+    assert main.write_if_changed(str(path), "#define A 2\n")
+    assert path.read_text() == "#define A 2\n"
+    assert path.stat().st_mtime_ns != 10**18
+    assert [p.name for p in tmp_path.iterdir()] == ["yuneta_config.h"]
@@ -0,0 +1,132 @@
+import base64
+import json
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from yunetas.agent_tools import sync_binaries
+from yunetas.agent_tools.agent_client import AgentSession
+
+# A stand-in for ycommand and the agent behind it. Its state is a JSON file:
+# the slots it holds (their content, base64) and its yunos. $$(<role>) is
+# expanded from STANDIN_YUNOS, as ycommand reads the role's binary.
+STANDIN = textwrap.dedent("""\
+    import base64, json, os, re, sys
+    state_path = os.environ["STANDIN_STATE"]
+    with open(state_path) as f:
+        state = json.load(f)
+    cmd = sys.argv[sys.argv.index("-c") + 1]
+    with open(state_path + ".log", "a") as f:
+        f.write(cmd + "\\n")
+
+    def expand(m):
+        with open(os.path.join(os.environ["STANDIN_YUNOS"], m.group(1)), "rb") as f:
+            return base64.b64encode(f.read()).decode("ascii")
+
+    cmd = re.sub(r"\\$\\$\\(([^)]+)\\)", expand, cmd)
+    words = cmd.split()
+    kw = dict(w.split("=", 1) for w in words[1:] if "=" in w)
+    role = kw.get("yuno_role")
+    yunos = [y for y in state["yunos"] if not role or y["yuno_role"] == role]
+    if words[0] == "*list-binaries":
+        out = [{"id": k, "size": len(base64.b64decode(v))} for k, v in state["slots"].items()]
+        print("\\n" + json.dumps(out) + "\\n\\033[32m*list-binaries\\033[0m")
+    elif words[0] == "*list-yunos":
+        print("\\n" + json.dumps(yunos))
+    elif words[0] in ("install-binary", "update-binary"):
+        if words[0] == "update-binary" and any(y["yuno_running"] for y in state["yunos"]
+                                                if y["yuno_role"] == kw["id"]):
+            print("ERROR: text file busy")
+        else:
+            state["slots"][kw["id"]] = kw["content64"]
+            print("%s: done" % words[0])
+    elif words[0] == "kill-yuno":
+        for y in yunos:
+            y["yuno_running"] = y["yuno_playing"] = False
+        print("killed")
+    elif words[0] == "run-yuno":
+        for y in yunos:
+            y["yuno_running"] = True
+        print("running")
+    elif words[0] == "play-yuno":
+        for y in yunos:
+            y["yuno_playing"] = True
+        print("playing")
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+""")
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    yunos = tmp_path / "yunos"
+    yunos.mkdir()
+    script = tmp_path / "standin.py"
+    script.write_text(STANDIN)
+    ycommand = tmp_path / "ycommand"
+    ycommand.write_text("#!/bin/sh\nexec %s %s \"$@\"\n" % (sys.executable, script))
+    os.chmod(str(ycommand), stat.S_IRWXU)
+    state = tmp_path / "agent.json"
+    state.write_text(json.dumps({"slots": {}, "yunos": []}))
+    monkeypatch.setenv("STANDIN_STATE", str(state))
+    monkeypatch.setenv("STANDIN_YUNOS", str(yunos))
+
+    class Agent(object):
+        session = AgentSession(str(ycommand))
+
+        def binary(self, role, content):
+            (yunos / role).write_bytes(content)
+
+        def state(self):
+            return json.loads(state.read_text())
+
+        def set_yunos(self, yunos):
+            s = self.state()
+            s["yunos"] = yunos
+            state.write_text(json.dumps(s))
+
+        def commands(self):
+            return (tmp_path / "agent.json.log").read_text().splitlines()
+
+    return Agent()
+
+
+def slot_content(agent, role):
+    return base64.b64decode(agent.state()["slots"][role])
+
+
+def test_install_round_trip(agent):
+    content = bytes(range(256)) * 64
+    agent.binary("y1", content)
+    assert sync_binaries.deploy_install(agent.session, "install-binary", "y1", False)
+    assert slot_content(agent, "y1") == content
+    assert sync_binaries.agent_binaries(agent.session)["y1"]["size"] == len(content)
+    uploads = [c for c in agent.commands() if c.startswith("install-binary")]
+    assert uploads == ["install-binary id=y1 content64=$$(y1)"]
+
+
+def test_update_with_restart_round_trip(agent):
+    agent.binary("y1", b"old build")
+    sync_binaries.deploy_install(agent.session, "install-binary", "y1", False)
+    agent.set_yunos([{"id": "1", "yuno_role": "y1", "role_version": "1.0.0",
+                      "yuno_running": True, "yuno_playing": True}])
+    agent.binary("y1", b"new build, same version")
+
+    ok, downtime, ready = sync_binaries.deploy_update_with_restart(
+        agent.session, "y1", "1.0.0", False, wait_ready=5)
+
+    assert ok and ready is True and downtime is not None
+    assert slot_content(agent, "y1") == b"new build, same version"
+    assert agent.state()["yunos"][0]["yuno_playing"] is True
+    # The upload is inside the window: the agent cannot stage it beside the slot.
+    order = [c.split()[0] for c in agent.commands() if not c.startswith("*")]
+    assert order == ["install-binary", "kill-yuno", "update-binary", "run-yuno", "play-yuno"]
+
+
+def test_dry_run_sends_nothing(agent):
+    agent.binary("y1", b"content")
+    assert sync_binaries.deploy_install(agent.session, "install-binary", "y1", True)
+    assert agent.state()["slots"] == {}
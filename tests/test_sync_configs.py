@@ -0,0 +1,121 @@
+import json
+import subprocess
+
+import pytest
+
+from yunetas.agent_tools import sync_configs
+from yunetas.agent_tools.agent_client import AgentSession
+from yunetas.agent_tools.sync_configs import load_jsonc, strip_jsonc
+
+
+@pytest.mark.parametrize("text, value", [
+    ('{"url": "http://host//path"} // trailing', {"url": "http://host//path"}),
+    ('{"glob": "/* not a comment */"} /* a comment */', {"glob": "/* not a comment */"}),
+    ('{"q": "say \\"// no\\" /* no */"} // yes', {"q": 'say "// no" /* no */'}),
+    ('{"path": "C:\\\\"} // the backslash is escaped', {"path": "C:\\"}),
+    ('{"a": 1, /* "b": 2, */ "c": 3}', {"a": 1, "c": 3}),
+    ('{"a": 1 / 1}', None),
+])
+def test_strip_jsonc_leaves_strings_alone(text, value):
+    stripped = strip_jsonc(text)
+    assert len(stripped) == len(text)
+    if value is None:
+        assert stripped == text
+    else:
+        assert json.loads(stripped) == value
+
+
+def test_jsonc_error_points_into_the_file(tmp_path):
+    path = tmp_path / "c.json"
+    path.write_text('{\n  /* two\n     lines */\n  "a": 1,\n  "b": x\n}\n')
+    with pytest.raises(json.JSONDecodeError) as info:
+        load_jsonc(str(path))
+    assert (info.value.lineno, info.value.colno) == (5, 8)
+
+
+def write_config(path, version, **fields):
+    content = dict(fields, __version__=version)
+    path.write_text("// deployable\n" + json.dumps(content))
+    return content
+
+
+def test_config_cache_reparses_only_edited_files(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sync_configs, "CONFIG_CACHE_DIR", str(tmp_path / "cache"))
+    d = tmp_path / "batch"
+    d.mkdir()
+    write_config(d / "a.json", "1", x=1)
+    write_config(d / "b.json", "1", y=2)
+    config_dir = str(d)
+
+    def scan():
+        cache = sync_configs.load_config_cache(config_dir)
+        local = sync_configs.local_configs(config_dir, cache)
+        sync_configs.save_config_cache(config_dir, cache)
+        return local, capsys.readouterr().out.splitlines()[-1].strip()
+
+    local, counts = scan()
+    assert counts == "configs: 2 parsed, 0 from the cache"
+    first = local["b"]["digest"]
+
+    local, counts = scan()
+    assert counts == "configs: 0 parsed, 2 from the cache"
+    assert local["a"]["content"] is None
+    assert sync_configs.config_content(local["a"]) == {"__version__": "1", "x": 1}
+
+    content = write_config(d / "b.json", "2", y=30)
+    (d / "a.json").unlink()
+    local, counts = scan()
+    assert counts == "configs: 1 parsed, 0 from the cache"
+    assert local["b"]["version"] == "2"
+    assert local["b"]["digest"] == sync_configs.content_digest(content) != first
+    assert list(sync_configs.load_config_cache(config_dir)) == ["b.json"]
+    assert sync_configs.load_config_cache(str(tmp_path)) == {}
+
+
+class ListingSession(AgentSession):
+    """An AgentSession whose '*list-configs' answers `records`; None fails."""
+
+    def __init__(self, records):
+        AgentSession.__init__(self, "ycommand")
+        self.records = records
+        self.queries = []
+
+    def query(self, cmd_str, timeout=30, fresh=False, check=False):
+        self.queries.append((cmd_str, fresh))
+        if self.records is None:
+            raise subprocess.TimeoutExpired(cmd_str, timeout)
+        return self.records
+
+
+def test_diff_shows_only_update_rows_with_secrets_masked(tmp_path, capsys):
+    d = tmp_path / "batch"
+    d.mkdir()
+    write_config(d / "a.json", "1", x=2, password=sync_configs.SECRET_SENTINEL)
+    same = write_config(d / "b.json", "1", y=1)
+    local = sync_configs.local_configs(str(d))
+    theirs = {"__version__": "1", "x": 1, "password": "hunter2"}
+    session = ListingSession([
+        {"id": "a", "version": "1", "zcontent": theirs},
+        {"id": "b", "version": "1", "digest": sync_configs.content_digest(same),
+         "zcontent": same},
+        {"id": "c", "version": "1", "zcontent": {"__version__": "1"}},
+    ])
+
+    rows = sync_configs.classify(local, sync_configs.agent_configs(session), {})
+    assert [(r["id"], r["kind"]) for r in rows] == [
+        ("a", "update"), ("b", "uptodate"), ("c", "orphan")]
+    contents = sync_configs.agent_config_contents(session, ["a"])
+    assert contents == {"a": theirs}
+    assert session.queries[-1] == ("*list-configs", True)
+
+    capsys.readouterr()
+    sync_configs.print_config_diff(rows[0], contents["a"])
+    out = capsys.readouterr().out
+    lines = out.splitlines()
+    assert '-  "x": 1' in lines and '+  "x": 2' in lines
+    assert '   "password": "__SECRET__",' in lines
+    assert "hunter2" not in out
+
+    sync_configs.print_config_diff(rows[0], None)
+    assert "cannot read the agent's content of a" in capsys.readouterr().out
+    assert sync_configs.agent_config_contents(ListingSession(None), ["a"]) == {}
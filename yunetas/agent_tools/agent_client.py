@@ -0,0 +1,851 @@
+# -*- coding: utf-8 -*-
+"""
+agent_client.py — the one way the deploy tools and the CLI talk to a
+yuneta_agent.
+
+Everything goes through an ``AgentSession``: it holds what every call needs
+(the ycommand binary, the url, the jwt, the TLS flags) and runs the commands.
+The tools used to rebuild the ycommand argv and call ``subprocess.run`` at
+every site, each with its own timeout and error handling.
+
+The transport is still one ``ycommand -c '<cmd>'`` per command: the agent's
+websocket protocol is ycommand's business, and ycommand has no batch mode with
+a framed answer per command that a client could drive through a pipe. What
+the session saves instead is the calls it can avoid:
+
+  * read-only listings (``*list-binaries``, ``*list-yunos``...) are answered
+    from the session once read, until a command that changes the agent runs;
+    a poll asks for a ``fresh`` answer;
+  * the listings a tool starts from are asked for all at once (snapshot()),
+    so discovery costs one round trip instead of one per listing;
+  * the jwt is renewed before it expires, when the session was given the means
+    to (a long deploy outlives a 5-minute Keycloak token);
+  * waiting for a state (a yuno to exit, or to come up: wait_yunos_ready())
+    asks with a growing pause (poll()) instead of at a fixed rate;
+  * every call is counted and timed, so a tool can say what the agent cost.
+
+It also holds the prologue the tools share: the colour helpers and ask(), the
+OAuth2/TLS arguments (add_connection_args()) and the session built from them
+(connect()). The login is done once per process: a token obtain_jwt() got is
+kept in memory (never on disk) and handed to the next tool of the same run
+while it has time left, so ``yunetas sync`` logs in once for its binaries and
+its configs. And the helpers of the caches the tools keep across runs
+(file_key(), load_json_cache(), save_json_cache()).
+
+Stdlib only.
+"""
+
+import base64
+import codecs
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------------------------------------------------------
+#   ANSI colours (only when stdout is a tty)
+# ----------------------------------------------------------------------------
+_TTY = sys.stdout.isatty()
+
+
+def c(code, s):
+    if not _TTY:
+        return s
+    return "\033[%sm%s\033[0m" % (code, s)
+
+
+def bold(s):
+    return c("1", s)
+
+
+def green(s):
+    return c("32", s)
+
+
+def yellow(s):
+    return c("33", s)
+
+
+def red(s):
+    return c("31", s)
+
+
+def cyan(s):
+    return c("36", s)
+
+
+def dim(s):
+    return c("90", s)
+
+
+def ask(prompt):
+    try:
+        return input(prompt).strip().lower()
+    except EOFError:
+        return "q"
+
+
+# ----------------------------------------------------------------------------
+#   ycommand output
+# ----------------------------------------------------------------------------
+_ANSI_RE = re.compile(r"\033\[[0-9;]*m")
+
+# An ANSI sequence cut short at the end of a piece: the rest is in the next.
+_ANSI_TAIL_RE = re.compile(r"\033(?:\[[0-9;]*)?\Z")
+_JSON_START_RE = re.compile(r"[\[{]")
+_SPACE_RE = re.compile(r"\s*")
+
+# How much of the output a LeadingJSONDecoder keeps for its errors' ``doc``.
+ERROR_HEAD = 64 * 1024
+
+
+def parse_leading_json(text):
+    """
+    ycommand wraps the JSON payload with a leading blank line and a trailing
+    coloured footer (the command name). Strip ANSI, locate the first '[' or
+    '{' and decode just that value, ignoring whatever trails it.
+    """
+    decoder = LeadingJSONDecoder()
+    decoder.feed(text or "")
+    return decoder.close()
+
+
+class LeadingJSONDecoder(object):
+    """
+    parse_leading_json() for output that arrives in pieces: feed() each piece,
+    close() at the end for the value.
+
+    ANSI sequences are stripped from each piece as it is fed, wherever they
+    are (one cut at the end of a piece waits for the next), as
+    parse_leading_json() always did with the whole text. Valid JSON cannot
+    hold a raw ESC, so this only changes output that would fail otherwise.
+
+    The lead-in is dropped as soon as it is read. A top-level array, the shape
+    of every ycommand listing, is decoded one element at a time as each one is
+    complete, and the text of what has been decoded is let go of, so a
+    multi-MB listing is never held whole as text next to its objects. Any
+    other value is decoded at close().
+
+    Pieces are kept in a list and joined only when there is something to try:
+    an element still incomplete is tried again once the text after it has
+    doubled, and any other value once, at close(). Growing one string piece by
+    piece would copy it whole at every piece, quadratic in a single large
+    object or element.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""              # the text being decoded, from _pos on
+        self._pos = 0
+        self._parts = []            # pieces fed since, not yet joined to _buf
+        self._parts_len = 0
+        self._state = "lead"        # lead -> array | value -> done (| failed)
+        self._error = None          # what failed, raised by close()
+        self._expect_value = True   # in the array: a value (else ',' or ']') next
+        self._retry_len = 0         # an incomplete element is tried again at this length
+        self._items = []
+        self._value = None
+        self._head = []
+        self._head_len = 0
+        self._carry = ""            # an ANSI sequence cut at the end of a piece
+        self._offset = 0            # where _buf starts in the text fed
+        self._fed = 0
+
+    def feed(self, text):
+        text = self._carry + text
+        self._carry = ""
+        if "\033" in text:
+            m = _ANSI_TAIL_RE.search(text)
+            if m is not None:
+                self._carry = text[m.start():]
+                text = text[:m.start()]
+            text = _ANSI_RE.sub("", text)
+        self._feed(text)
+
+    def _feed(self, text):
+        self._fed += len(text)
+        if self._head_len < ERROR_HEAD:
+            piece = text[:ERROR_HEAD - self._head_len]
+            self._head.append(piece)
+            self._head_len += len(piece)
+        if self._state in ("done", "failed") or not text:
+            return
+        self._parts.append(text)
+        self._parts_len += len(text)
+        if self._state == "value":
+            return
+        if self._state == "array" and \
+                len(self._buf) - self._pos + self._parts_len < self._retry_len:
+            return
+        try:
+            self._advance(final=False)
+        except json.JSONDecodeError as e:
+            # Told by close(): the caller reads the output to its end anyway.
+            self._error = e
+            self._state = "failed"
+            self._buf = ""
+            self._parts = []
+
+    def close(self):
+        """
+        The decoded value. Raises json.JSONDecodeError with the head of the
+        output (ANSI stripped) as ``doc`` and the offset of the error in the
+        whole output as ``pos``.
+        """
+        if self._carry:
+            carry, self._carry = self._carry, ""
+            self._feed(carry)
+        if self._error is not None:
+            raise self._error
+        self._advance(final=True)
+        if self._state != "done":
+            what = "no JSON value found" if self._state == "lead" else "unterminated JSON value"
+            raise json.JSONDecodeError(what, "".join(self._head), self._fed)
+        return self._value
+
+    def _fail(self, e):
+        """Raise `e`, an error at e.pos in _buf, at its offset in the output."""
+        raise json.JSONDecodeError(e.msg, "".join(self._head), self._offset + e.pos)
+
+    def _join(self):
+        """Append the pending pieces to what is left of the buffer."""
+        if self._parts:
+            self._buf = "".join([self._buf[self._pos:]] + self._parts)
+            self._offset += self._pos
+            self._pos = 0
+            self._parts = []
+            self._parts_len = 0
+
+    def _advance(self, final):
+        self._join()
+        if self._state == "lead":
+            m = _JSON_START_RE.search(self._buf, self._pos)
+            if m is None:
+                self._offset += len(self._buf)
+                self._buf = ""
+                self._pos = 0
+                return
+            if m.group(0) == "[":
+                self._state = "array"
+                self._pos = m.end()
+            else:
+                self._state = "value"
+                self._pos = m.start()
+
+        if self._state == "value":
+            if final:
+                try:
+                    self._value, _ = self._decoder.raw_decode(self._buf, self._pos)
+                except json.JSONDecodeError as e:
+                    self._fail(e)
+                self._buf = ""
+                self._pos = 0
+                self._state = "done"
+            return
+
+        buf = self._buf
+        pos = self._pos
+        while self._state == "array":
+            pos = _SPACE_RE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if self._expect_value:
+                if buf[pos] == "]" and not self._items:
+                    self._done()
+                    break
+                if not final and len(buf) - pos < self._retry_len:
+                    break
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if final:
+                        self._fail(e)
+                    # Incomplete (or bad, which close() will tell): try again
+                    # once the text has doubled, so a large element costs a
+                    # few attempts, not one per piece.
+                    self._retry_len = 2 * (len(buf) - pos)
+                    break
+                if not final and isinstance(item, (int, float)) and not isinstance(item, bool):
+                    # A number ends where its text does: "1." or "1.5e" may
+                    # go on in the next piece.
+                    nxt = _SPACE_RE.match(buf, end).end()
+                    if nxt == len(buf) or buf[nxt] not in ",]":
+                        break
+                self._items.append(item)
+                self._retry_len = 0
+                self._expect_value = False
+                pos = end
+            elif buf[pos] == ",":
+                self._expect_value = True
+                pos += 1
+            elif buf[pos] == "]":
+                self._done()
+            else:
+                self._fail(json.JSONDecodeError("Expecting ',' delimiter", buf, pos))
+        if self._state == "array":
+            self._pos = pos
+        else:
+            self._buf = ""
+            self._pos = 0
+
+    def _done(self):
+        self._value = self._items
+        self._state = "done"
+
+
+def jwt_expiry(jwt):
+    """The ``exp`` claim of a jwt (epoch seconds), or None if it has none."""
+    try:
+        payload = jwt.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+# ----------------------------------------------------------------------------
+#   Session
+# ----------------------------------------------------------------------------
+#   Seconds before its expiry at which a jwt is renewed: a ycommand started
+#   with a token about to expire may not be connected by the time it does.
+JWT_RENEW_MARGIN = 60
+
+# query(): bytes read from ycommand's stdout at a time.
+READ_CHUNK = 64 * 1024
+
+# snapshot(): a listing that did not answer.
+_FAILED = object()
+
+#   poll(): the first pause between two asks, the factor it grows by and its
+#   ceiling, in seconds. Most states poll() waits for (a yuno exiting) settle
+#   within a fraction of a second: the first asks come quickly, and a state
+#   that takes longer is asked about a few times a second at most.
+POLL_FIRST = 0.05
+POLL_FACTOR = 2.0
+POLL_MAX = 1.0
+
+
+class AgentSession(object):
+    """
+    What a run needs to talk to one agent, and the listings it has read.
+
+    Not a persistent connection: every command is still its own ycommand
+    process, which connects, authenticates, runs it and exits. The session
+    keeps the connection flags and jwt, answers a listing already read from
+    memory, and counts the calls.
+
+    Args:
+        ycommand (str): path to the ycommand binary.
+        url (str|None): agent url (``-u``); None for ycommand's default.
+        jwt (str|None): token passed with ``-j`` on every call.
+        flags (list): any other connection flags (TLS, OAuth2 identity).
+        renew (callable|None): returns a new jwt; called when the current one
+            is about to expire. Without it the jwt is used as given.
+    """
+
+    def __init__(self, ycommand, url=None, jwt=None, flags=(), renew=None):
+        self.ycommand = ycommand
+        self.url = url
+        self.jwt = jwt
+        self.flags = list(flags)
+        self.renew = renew
+        self.calls = 0
+        self.cached = 0
+        self.seconds = 0.0
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def argv(self, cmd_str=None):
+        """Full ycommand argv for `cmd_str` (or the bare connection flags)."""
+        cmd = [self.ycommand]
+        if self.url:
+            cmd += ["-u", self.url]
+        jwt = self._current_jwt()
+        if jwt:
+            cmd += ["-j", jwt]
+        cmd += self.flags
+        if cmd_str is not None:
+            cmd += ["-c", cmd_str]
+        return cmd
+
+    def _current_jwt(self):
+        if self.jwt and self.renew is not None:
+            exp = jwt_expiry(self.jwt)
+            if exp is not None and exp - time.time() < JWT_RENEW_MARGIN:
+                with self._lock:
+                    # Another thread may have renewed it meanwhile.
+                    exp = jwt_expiry(self.jwt)
+                    if exp is not None and exp - time.time() < JWT_RENEW_MARGIN:
+                        self.jwt = self.renew() or self.jwt
+        return self.jwt
+
+    # ------------------------------------------------------------------
+    def call(self, cmd_str, timeout=30):
+        """
+        Run one command and return the ``subprocess.CompletedProcess``.
+
+        stdin is closed: a ycommand that cannot connect retries, and with the
+        terminal's stdin it drops the operator into an interactive session.
+        Raises what ``subprocess.run`` raises (OSError, SubprocessError).
+        """
+        t0 = time.monotonic()
+        try:
+            return subprocess.run(
+                self.argv(cmd_str), capture_output=True, text=True,
+                stdin=subprocess.DEVNULL, timeout=timeout,
+            )
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.seconds += time.monotonic() - t0
+
+    def query(self, cmd_str, timeout=30, fresh=False, check=False):
+        """
+        Run a read-only '*command' and return its decoded JSON payload.
+
+        The answer is kept for the rest of the session, until run() changes
+        the agent; `fresh` asks the agent again (polling a state). An answer
+        from a ycommand that exited non-zero is not kept, and with `check` it
+        raises subprocess.CalledProcessError (with ``stderr``) instead.
+        The payload is decoded while ycommand writes it (LeadingJSONDecoder).
+        Raises OSError, SubprocessError, or json.JSONDecodeError with the
+        output (its first ERROR_HEAD characters, ANSI stripped) in its
+        ``doc``, the offset of the error in it in its ``pos``, and
+        ycommand's exit code and stderr (its head) in its ``returncode`` and
+        ``stderr``.
+        """
+        if not fresh:
+            with self._lock:
+                if cmd_str in self._listings:
+                    self.cached += 1
+                    return self._listings[cmd_str]
+        data, returncode, stderr = self._read_json(cmd_str, timeout)
+        if returncode != 0:
+            if check:
+                raise subprocess.CalledProcessError(returncode, cmd_str, stderr=stderr)
+            return data
+        with self._lock:
+            self._listings[cmd_str] = data
+        return data
+
+    def _read_json(self, cmd_str, timeout):
+        """
+        Run `cmd_str` and decode its payload from the pipe as it comes
+        (LeadingJSONDecoder), instead of decoding the captured whole.
+        stderr is drained alongside, its head kept for the error.
+
+        Returns:
+            tuple: (payload, exit code, stderr head).
+        """
+        argv = self.argv(cmd_str)
+        t0 = time.monotonic()
+        timed_out = []
+        try:
+            proc = subprocess.Popen(
+                argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+
+            def expire():
+                timed_out.append(True)
+                proc.kill()
+
+            err = []
+
+            def drain():
+                kept = 0
+                with proc.stderr:
+                    for chunk in iter(lambda: proc.stderr.read1(READ_CHUNK), b""):
+                        if kept < ERROR_HEAD:
+                            err.append(chunk[:ERROR_HEAD - kept])
+                            kept += len(err[-1])
+
+            reader = threading.Thread(target=drain, daemon=True)
+            reader.start()
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+            try:
+                text = codecs.getincrementaldecoder("utf-8")("replace")
+                decoder = LeadingJSONDecoder()
+                with proc.stdout:
+                    for chunk in iter(lambda: proc.stdout.read1(READ_CHUNK), b""):
+                        decoder.feed(text.decode(chunk))
+                decoder.feed(text.decode(b"", final=True))
+                proc.wait()
+            finally:
+                timer.cancel()
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+                reader.join()
+            stderr = b"".join(err).decode("utf-8", "replace")
+            if timed_out:
+                # cmd_str, not argv: the argv carries the jwt.
+                raise subprocess.TimeoutExpired(cmd_str, timeout, stderr=stderr)
+            try:
+                return decoder.close(), proc.returncode, stderr
+            except json.JSONDecodeError as e:
+                e.returncode = proc.returncode
+                e.stderr = stderr
+                raise
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.seconds += time.monotonic() - t0
+
+    def snapshot(self, cmd_strs, timeout=30):
+        """
+        Ask for several read-only listings at once and keep them in the session.
+
+        The ycommands run side by side, so the agent state they describe is
+        read within one round trip rather than across several. A listing that
+        fails is left out: the query() that needs it asks again and reports the
+        error where it is understood.
+
+        Returns:
+            dict: {cmd_str: decoded payload} of the listings that answered.
+        """
+        cmd_strs = list(dict.fromkeys(cmd_strs))
+        out = {}
+        if not cmd_strs:
+            return out
+
+        def one(cmd_str):
+            try:
+                return self.query(cmd_str, timeout=timeout, fresh=True)
+            except (OSError, subprocess.SubprocessError, ValueError):
+                return _FAILED
+
+        with ThreadPoolExecutor(max_workers=len(cmd_strs)) as pool:
+            for cmd_str, data in zip(cmd_strs, pool.map(one, cmd_strs)):
+                if data is not _FAILED:
+                    out[cmd_str] = data
+        return out
+
+    def poll(self, cmd_str, done, timeout=15.0):
+        """
+        Ask the read-only `cmd_str` again and again (fresh) until
+        ``done(payload)`` is true, pausing POLL_FIRST seconds, then growing by
+        POLL_FACTOR up to POLL_MAX. A call that fails gives ``done(None)``.
+
+        ycommand cannot hold a connection open to receive the agent's events,
+        so waiting for a state is asking for it; the backoff keeps the asks few.
+
+        Returns:
+            bool: True if `done` was met within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        pause = POLL_FIRST
+        while True:
+            try:
+                data = self.query(cmd_str, fresh=True)
+            except (OSError, subprocess.SubprocessError, ValueError):
+                data = None
+            if done(data):
+                return True
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            time.sleep(min(pause, left))
+            pause = min(pause * POLL_FACTOR, POLL_MAX)
+
+    def run(self, cmd_str, timeout=120):
+        """
+        Run a command that may change the agent; drops every listing kept.
+        Returns the ``subprocess.CompletedProcess``.
+        """
+        self.invalidate()
+        try:
+            return self.call(cmd_str, timeout=timeout)
+        finally:
+            self.invalidate()
+
+    def invalidate(self):
+        """Forget the listings read so far."""
+        with self._lock:
+            self._listings.clear()
+
+    def describe_cost(self):
+        """One line: how many ycommand calls the run made, and their time."""
+        return "agent: %d ycommand call(s) in %.1fs, %d answered from the session" % (
+            self.calls, self.seconds, self.cached)
+
+
+# ----------------------------------------------------------------------------
+#   OAuth2 — log in ONCE, reuse the token on every ycommand call
+# ----------------------------------------------------------------------------
+#   ycommand reads its credentials only from argp and does NOT cache a token
+#   between one-shot `-c` invocations, so passing -x/-X would re-run the
+#   password grant on every call. Instead we log in once here (Keycloak
+#   password grant), then thread the resulting jwt through `-j` to every
+#   invocation. This is what lets the tools drive a REMOTE wss:// agent
+#   with SSH disabled. Stdlib only — no external deps.
+def add_connection_args(ap):
+    """Add the OAuth2 and TLS argument groups every tool takes to `ap`."""
+    auth = ap.add_argument_group(
+        "OAuth2 (remote wss:// agent; logs in ONCE, reuses the token via -j)")
+    auth.add_argument("-I", "--issuer", default=None,
+                      help="OIDC issuer for discovery, e.g. "
+                           "https://auth.artgins.com/realms/artgins")
+    auth.add_argument("-T", "--token-endpoint", default=None,
+                      help="explicit token endpoint (skips discovery).")
+    auth.add_argument("-Z", "--client-id", default=None, help="OAuth2 client_id.")
+    auth.add_argument("--client-secret", default=None,
+                      help="OAuth2 client_secret (confidential client only).")
+    auth.add_argument("-x", "--user-id", default=None, help="OAuth2 username.")
+    auth.add_argument("-X", "--user-passw", default=None, help="OAuth2 password.")
+    auth.add_argument("-j", "--jwt", default=None,
+                      help="reuse this jwt directly (skip the login).")
+
+    tls = ap.add_argument_group("TLS (wss:// agent)")
+    tls.add_argument("--ssl-trusted-certificate", default=None,
+                     help="PEM of the CA that signs the agent certificate.")
+    tls.add_argument("--ssl-server-name", default=None,
+                     help="name to check the agent certificate against "
+                          "(default: the host of the url).")
+
+
+def _http_json(url, data=None, timeout=30):
+    """GET (data=None) or form-urlencoded POST, returning parsed JSON."""
+    body = None
+    headers = {}
+    if data is not None:
+        body = urllib.parse.urlencode(data).encode("utf-8")
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    req = urllib.request.Request(url, data=body, headers=headers)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+# Token endpoints read from discovery documents, by issuer.
+_token_endpoints = {}
+
+
+def discover_token_endpoint(issuer, timeout=30):
+    """Read token_endpoint from the issuer's OIDC discovery document."""
+    ep = _token_endpoints.get(issuer)
+    if ep:
+        return ep
+    doc = _http_json(issuer.rstrip("/") + "/.well-known/openid-configuration",
+                     timeout=timeout)
+    ep = doc.get("token_endpoint")
+    if not ep:
+        raise RuntimeError("OIDC discovery document has no token_endpoint")
+    _token_endpoints[issuer] = ep
+    return ep
+
+
+# Tokens obtained by this process, by (token endpoint, client, user): the
+# next tool of the same run reuses one while it has JWT_RENEW_MARGIN left.
+_tokens = {}
+
+
+def obtain_jwt(args):
+    """
+    Return one jwt to reuse on every ycommand call, or None for a local/
+    unauthenticated run:
+      * --jwt given                                 -> used verbatim.
+      * user-id + passw + (issuer | token-endpoint) -> password grant, once
+                                                       per process.
+      * otherwise                                   -> None (local ws:// needs none).
+    """
+    if args.jwt:
+        return args.jwt
+    if not (args.user_id and args.user_passw and (args.issuer or args.token_endpoint)):
+        return None
+    token_endpoint = args.token_endpoint or discover_token_endpoint(args.issuer)
+    key = (token_endpoint, args.client_id or "", args.user_id)
+    jwt = _tokens.get(key)
+    if jwt:
+        exp = jwt_expiry(jwt)
+        if exp is None or exp - time.time() >= JWT_RENEW_MARGIN:
+            print(dim("reusing the token from %s" % token_endpoint))
+            return jwt
+    form = {
+        "grant_type": "password",
+        "client_id": args.client_id or "",
+        "username": args.user_id,
+        "password": args.user_passw,
+    }
+    if args.client_secret:
+        form["client_secret"] = args.client_secret
+    print(dim("authenticating once at %s ..." % token_endpoint))
+    try:
+        tok = _http_json(token_endpoint, data=form)
+    except urllib.error.HTTPError as e:
+        detail = ""
+        try:
+            detail = e.read().decode("utf-8", "replace")
+        except Exception:
+            pass
+        print(red("ERROR: OAuth2 login failed (HTTP %s): %s" % (e.code, detail or e.reason)))
+        sys.exit(2)
+    except Exception as e:
+        print(red("ERROR: OAuth2 login failed: %s" % e))
+        sys.exit(2)
+    jwt = tok.get("access_token")
+    if not jwt:
+        print(red("ERROR: token endpoint returned no access_token."))
+        sys.exit(2)
+    _tokens[key] = jwt
+    return jwt
+
+
+def tls_flags(args):
+    """
+    The TLS flags for a wss:// agent, from the parsed arguments.
+
+    The agent serves one long-life certificate of its own on every node, so
+    the name never matches the host dialed: --ssl-server-name says which name
+    to check the certificate against, and the chain is still validated.
+    """
+    flags = []
+    trusted = getattr(args, "ssl_trusted_certificate", None)
+    if trusted:
+        flags += ["--ssl-trusted-certificate", trusted]
+    server_name = getattr(args, "ssl_server_name", None)
+    if server_name:
+        flags += ["--ssl-server-name", server_name]
+    return flags
+
+
+def connect(ycommand, args):
+    """
+    The AgentSession of a tool's run, from its parsed arguments (-u, the
+    OAuth2 identity and the TLS flags of add_connection_args()).
+
+    A token from our own login is renewed the same way when it runs out
+    halfway through a long run; a --jwt given by hand is used as is.
+    """
+    jwt = obtain_jwt(args)
+    return AgentSession(
+        ycommand, args.url, jwt, tls_flags(args),
+        renew=(lambda: obtain_jwt(args)) if jwt and not args.jwt else None,
+    )
+
+
+# ----------------------------------------------------------------------------
+#   Yuno readiness
+# ----------------------------------------------------------------------------
+#   wait_yunos_ready(): how long the yunos must stay up once they all are, to
+#   be ready. A yuno that crashes in its first moments does it after playing as
+#   often as before.
+READY_SETTLE = 0.5
+
+
+def wait_yunos_ready(session, cmd_str, want, timeout):
+    """
+    After a run-yuno / play-yuno, wait until the yunos came up: every id in
+    `want` ({yuno id: must be playing}) listed by the '*list-yunos ...'
+    `cmd_str` reports yuno_running, and yuno_playing where asked, and still
+    does READY_SETTLE seconds later.
+
+    A yuno seen running that its record then reports not running is taken
+    for a crash loop and not waited for any longer. A dip shorter than the
+    pause between two asks goes unseen: that one shows as a timeout. An ask
+    that fails (a ycommand timeout, a jwt hiccup) or a yuno missing from the
+    answer says nothing either way: the wait goes on.
+
+    Returns:
+        tuple: (state, seconds) with state "ready", "crashed" or "timeout";
+        seconds is the time to ready (until all were first seen up), else the
+        time waited.
+    """
+    t0 = time.monotonic()
+    seen_running = set()
+    crashed = []
+    up_since = []
+
+    def ready(data):
+        if not isinstance(data, list):
+            return False
+        records = dict((str(r.get("id")), r) for r in data if isinstance(r, dict))
+        up = True
+        for yid, playing in want.items():
+            rec = records.get(str(yid))
+            if rec is None:
+                up = False
+                continue
+            if rec.get("yuno_running"):
+                seen_running.add(yid)
+            elif yid in seen_running:
+                crashed.append(yid)
+                return True
+            if not rec.get("yuno_running") or (playing and not rec.get("yuno_playing")):
+                up = False
+        if not up:
+            del up_since[:]
+            return False
+        if not up_since:
+            up_since.append(time.monotonic())
+        return time.monotonic() - up_since[0] >= READY_SETTLE
+
+    met = session.poll(cmd_str, ready, timeout=timeout + READY_SETTLE)
+    if crashed:
+        return "crashed", time.monotonic() - t0
+    if met:
+        return "ready", up_since[0] - t0
+    return "timeout", time.monotonic() - t0
+
+
+def report_ready(name, state, seconds):
+    """Print how a wait_yunos_ready() for `name` ended; True iff ready."""
+    if state == "ready":
+        print(green("   %s ready in %.1fs" % (name, seconds)))
+        return True
+    if state == "crashed":
+        print(red("   ! %s stopped again %.1fs after starting (crash loop?)" % (name, seconds)))
+    else:
+        print(red("   ! %s not up after %.0fs" % (name, seconds)))
+    return False
+
+
+# ----------------------------------------------------------------------------
+#   Caches kept across runs (~/.yuneta/cache)
+# ----------------------------------------------------------------------------
+def file_key(path):
+    """
+    What identifies one version of a file: [dev, ino, size, mtime_ns, ctime_ns].
+    The ctime catches a rewrite whose mtime was put back (cp -p, touch -r).
+    """
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+
+
+def load_json_cache(path):
+    """The JSON object cached at `path`; {} if missing, unreadable or not an object."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_json_cache(path, data):
+    """
+    Write `data` to `path` as JSON, through a temporary file and a rename, so
+    a concurrent run reads the old cache or the new one, never half of it. A
+    cache that cannot be written is reported and left: the run goes on.
+    """
+    tmp = "%s.tmp.%d" % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(dim("  (cannot write %s: %s)" % (path, e)))
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
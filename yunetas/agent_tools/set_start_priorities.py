@@ -38,49 +38,19 @@ import argparse
 import base64
 import fnmatch
 import json
-import re
 import shutil
 import subprocess
 import sys
-import urllib.error
-import urllib.parse
-import urllib.request
-
-# ----------------------------------------------------------------------------
-#   ANSI colours (only when stdout is a tty)
-# ----------------------------------------------------------------------------
-_TTY = sys.stdout.isatty()
-
-
-def c(code, s):
-    if not _TTY:
-        return s
-    return "\033[%sm%s\033[0m" % (code, s)
-
-
-def bold(s):
-    return c("1", s)
-
-
-def green(s):
-    return c("32", s)
-
-
-def yellow(s):
-    return c("33", s)
-
-
-def red(s):
-    return c("31", s)
-
-
-def cyan(s):
-    return c("36", s)
-
-
-def dim(s):
-    return c("90", s)
 
+try:
+    from .agent_client import (
+        add_connection_args, ask, bold, connect, cyan, dim, green, red, yellow,
+    )
+except ImportError:
+    # Run as a script (./set_start_priorities.py): agent_client.py is beside it.
+    from agent_client import (
+        add_connection_args, ask, bold, connect, cyan, dim, green, red, yellow,
+    )
 
 # ----------------------------------------------------------------------------
 #   Default role -> tier rules (first match wins; explicit --rule comes first)
@@ -103,129 +73,19 @@ def tier_for_role(role, rules):
     return None  # no rule -> leave as-is
 
 
-# ----------------------------------------------------------------------------
-#   JSON helper
-# ----------------------------------------------------------------------------
-_ANSI_RE = re.compile(r"\033\[[0-9;]*m")
-
-
-def parse_leading_json(text):
-    """Strip ANSI, find the first JSON value, decode it, ignore any trailer."""
-    clean = _ANSI_RE.sub("", text or "")
-    start = None
-    for i, ch in enumerate(clean):
-        if ch in "[{":
-            start = i
-            break
-    if start is None:
-        raise json.JSONDecodeError("no JSON value found", clean, 0)
-    obj, _ = json.JSONDecoder().raw_decode(clean[start:])
-    return obj
-
-
-# ----------------------------------------------------------------------------
-#   OAuth2 — log in ONCE, reuse the token on every ycommand call
-# ----------------------------------------------------------------------------
-def _http_json(url, data=None, timeout=30):
-    body = None
-    headers = {}
-    if data is not None:
-        body = urllib.parse.urlencode(data).encode("utf-8")
-        headers["Content-Type"] = "application/x-www-form-urlencoded"
-    req = urllib.request.Request(url, data=body, headers=headers)
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
-
-
-def discover_token_endpoint(issuer, timeout=30):
-    doc = _http_json(issuer.rstrip("/") + "/.well-known/openid-configuration",
-                     timeout=timeout)
-    ep = doc.get("token_endpoint")
-    if not ep:
-        raise RuntimeError("OIDC discovery document has no token_endpoint")
-    return ep
-
-
-def obtain_jwt(args):
-    if args.jwt:
-        return args.jwt
-    if not (args.user_id and args.user_passw and (args.issuer or args.token_endpoint)):
-        return None
-    token_endpoint = args.token_endpoint or discover_token_endpoint(args.issuer)
-    form = {
-        "grant_type": "password",
-        "client_id": args.client_id or "",
-        "username": args.user_id,
-        "password": args.user_passw,
-    }
-    if args.client_secret:
-        form["client_secret"] = args.client_secret
-    print(dim("authenticating once at %s ..." % token_endpoint))
-    try:
-        tok = _http_json(token_endpoint, data=form)
-    except urllib.error.HTTPError as e:
-        detail = ""
-        try:
-            detail = e.read().decode("utf-8", "replace")
-        except Exception:
-            pass
-        print(red("ERROR: OAuth2 login failed (HTTP %s): %s" % (e.code, detail or e.reason)))
-        sys.exit(2)
-    except Exception as e:
-        print(red("ERROR: OAuth2 login failed: %s" % e))
-        sys.exit(2)
-    jwt = tok.get("access_token")
-    if not jwt:
-        print(red("ERROR: token endpoint returned no access_token."))
-        sys.exit(2)
-    return jwt
-
-
-#   TLS flags for a wss:// agent, set once in main() and used by every call.
-#   The agent serves one long-life certificate of its own on every node, so
-#   the name never matches the host dialed: --ssl-server-name says which name
-#   to check the certificate against, and the chain is still validated.
-TLS_FLAGS = []
-
-
-def ycmd_base(ycommand, url, jwt):
-    cmd = [ycommand]
-    if url:
-        cmd += ["-u", url]
-    if jwt:
-        cmd += ["-j", jwt]
-    cmd += TLS_FLAGS
-    return cmd
-
-
-def set_tls_flags(args):
-    """Record the TLS flags of the run, from the parsed arguments."""
-    global TLS_FLAGS
-    flags = []
-    trusted = getattr(args, "ssl_trusted_certificate", None)
-    if trusted:
-        flags += ["--ssl-trusted-certificate", trusted]
-    server_name = getattr(args, "ssl_server_name", None)
-    if server_name:
-        flags += ["--ssl-server-name", server_name]
-    TLS_FLAGS = flags
-
-
 # ----------------------------------------------------------------------------
 #   Agent I/O
 # ----------------------------------------------------------------------------
-def agent_yunos(ycommand, url, jwt):
+def agent_yunos(session):
     """Return the list of yuno records via '*list-yunos' (raw JSON)."""
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-yunos"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-        data = parse_leading_json(res.stdout)
+        data = session.query("*list-yunos")
     except (OSError, subprocess.SubprocessError) as e:
         print(red("ERROR: cannot run ycommand: %s" % e))
         sys.exit(2)
-    except json.JSONDecodeError:
+    except json.JSONDecodeError as e:
         print(red("ERROR: '*list-yunos' did not return JSON. Is the agent up?"))
-        print(dim((res.stdout or "")[:400]))
+        print(dim(e.doc[:400]))
         sys.exit(2)
     if not isinstance(data, list):
         print(red("ERROR: unexpected '*list-yunos' payload (not a list)."))
@@ -233,7 +93,7 @@ def agent_yunos(ycommand, url, jwt):
     return [r for r in data if isinstance(r, dict)]
 
 
-def set_start_priority(ycommand, url, jwt, yid, prio, dry_run):
+def set_start_priority(session, yid, prio, dry_run):
     """update-node the yuno's start_priority, record base64'd into content64."""
     record = json.dumps({"id": str(yid), "start_priority": int(prio)})
     content64 = base64.b64encode(record.encode("utf-8")).decode("ascii")
@@ -243,9 +103,8 @@ def set_start_priority(ycommand, url, jwt, yid, prio, dry_run):
     if dry_run:
         print(dim("   (dry-run, not executed)"))
         return True
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", cmd_str]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=60)
+        res = session.run(cmd_str, timeout=60)
     except (OSError, subprocess.SubprocessError) as e:
         print(red("   ERROR: %s" % e))
         return False
@@ -255,17 +114,10 @@ def set_start_priority(ycommand, url, jwt, yid, prio, dry_run):
     return ok
 
 
-def ask(prompt):
-    try:
-        return input(prompt).strip().lower()
-    except EOFError:
-        return "q"
-
-
 # ----------------------------------------------------------------------------
 #   Main
 # ----------------------------------------------------------------------------
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser(
         description="Assign each managed yuno's start_priority by role.")
     ap.add_argument("-u", "--url", default=None,
@@ -282,26 +134,8 @@ def main():
                          "before the built-in rules.")
     ap.add_argument("--show-all", action="store_true",
                     help="also list yunos already at their target priority.")
-    auth = ap.add_argument_group(
-        "OAuth2 (remote wss:// agent; logs in ONCE, reuses the token via -j)")
-    auth.add_argument("-I", "--issuer", default=None,
-                      help="OIDC issuer for discovery.")
-    auth.add_argument("-T", "--token-endpoint", default=None,
-                      help="explicit token endpoint (skips discovery).")
-    auth.add_argument("-Z", "--client-id", default=None, help="OAuth2 client_id.")
-    auth.add_argument("--client-secret", default=None, help="OAuth2 client_secret.")
-    auth.add_argument("-x", "--user-id", default=None, help="OAuth2 username.")
-    auth.add_argument("-X", "--user-passw", default=None, help="OAuth2 password.")
-    auth.add_argument("-j", "--jwt", default=None, help="reuse this jwt directly.")
-
-    tls = ap.add_argument_group("TLS (wss:// agent)")
-    tls.add_argument("--ssl-trusted-certificate", default=None,
-                     help="PEM of the CA that signs the agent certificate.")
-    tls.add_argument("--ssl-server-name", default=None,
-                     help="name to check the agent certificate against "
-                          "(default: the host of the url).")
-    args = ap.parse_args()
-    set_tls_flags(args)
+    add_connection_args(ap)
+    args = ap.parse_args(argv)
 
     ycommand = args.ycommand or shutil.which("ycommand")
     if not ycommand:
@@ -326,14 +160,14 @@ def main():
         rules.append((pat.strip(), pv))
     rules += BUILTIN_RULES
 
-    jwt = obtain_jwt(args)
+    session = connect(ycommand, args)
 
     print(dim("ycommand : %s%s%s" % (
         ycommand,
         ("  url=" + args.url) if args.url else "",
-        "  oauth2=on" if jwt else "")))
+        "  oauth2=on" if session.jwt else "")))
     print(dim("reading yunos (*list-yunos)..."))
-    yunos = agent_yunos(ycommand, args.url, jwt)
+    yunos = agent_yunos(session)
     if not yunos:
         print(yellow("No yunos returned by the agent."))
         return
@@ -384,7 +218,7 @@ def main():
     print()
     ok = fail = 0
     for p in changes:
-        if set_start_priority(ycommand, args.url, jwt, p["id"], p["target"], args.dry_run):
+        if set_start_priority(session, p["id"], p["target"], args.dry_run):
             ok += 1
         else:
             fail += 1
@@ -27,11 +27,13 @@ For every installed binary it decides:
   * INSTALLED  — local version already an installed slot, but  -> skipped (promote
                  not the primary (snap active / pending promote)   with upgrade-yunos)
   * DOWNGRADE  — local version  <  agent version             -> install-binary (flagged)
-  * REBUILD    — same version, content changed: size differs,  -> update-binary
-                 OR the local file is newer than the agent
-                 slot (a relink/edit that left the byte count
-                 unchanged still bumps the file time)
-  * UP-TO-DATE — same version, same size AND not newer         -> skipped
+  * REBUILD    — same version, content changed: digest differs -> update-binary
+                 (when known), else size differs, OR the local
+                 file is newer than the agent slot (a relink/
+                 edit that left the byte count unchanged still
+                 bumps the file time)
+  * UP-TO-DATE — same version, same digest, or same size AND   -> skipped
+                 not newer
   * NO-BUILD   — agent has it, but no build in outputs/yunos  -> skipped (informational)
 
 Size alone misses a rebuild that keeps the byte count identical (e.g. a one-char
@@ -43,6 +45,17 @@ matches. When the agent predates the ``time`` field it falls back to the
 embedded build datetime (``date``, the C ``__DATE__ " " __TIME__``, reported by
 both ``--print-role`` and ``*list-binaries``).
 
+Size and time are both guesses about the content, and the time guesses wrong
+both ways: a ``touch`` or a fresh checkout makes an identical binary "newer",
+and a build copied in with its old mtime preserved looks older. So every local
+binary is also hashed (blake2b), and when the content of the agent slot is
+known the two digests decide alone. The agent does not report a digest (a
+``digest`` field in the listings, ``blake2b:<hex>``, would be used as is), so
+the one recorded here after each successful push stands in for it
+(``~/.yuneta/cache/pushed_binaries.json``), for as long as the slot still
+shows the size and time it had right after that push. A slot this tool did
+not write falls back to size and time.
+
 Then it shows the candidates, asks what to apply, and runs the corresponding
 ``install-binary`` / ``update-binary`` for each chosen role.
 
@@ -59,6 +72,10 @@ node-wide):
     run-yuno yuno_role=R play=0   (only if it had been running)
     play-yuno yuno_role=R         (only if it had been playing)
 
+The time each role spent down, from the kill to the restored run/play, is
+reported per role. The upload happens inside that window: the agent has no
+command to stage a binary beside a live slot and swap it in.
+
 If the running instances are on a DIFFERENT version (e.g. a snap pins an older
 release), the slot being overwritten is not the one executing, so the
 kill/restart is skipped and ``update-binary`` writes in place. Prior run/play
@@ -72,7 +89,14 @@ all share the one slot.
 Roles are deployed in ascending ``start_priority`` (read from the agent via
 ``*list-yunos``, lowest among a role's instances), so a REBUILD brings
 infrastructure (logcenter/emailsender/auth_bff) back before gates and dba
-instead of in alphabetical order.
+instead of in alphabetical order. With ``--parallel N`` the roles that share a
+``start_priority`` are deployed up to N at a time, each one's output printed
+as a block when it is done, and the next priority starts when the whole tier
+is back: a node upgrade takes about the sum of its slowest role per tier.
+"Back" is the run/play answered; with ``--wait-ready`` it is the instances
+reporting running and playing again, with each role's time to ready, and a
+role that does not come up (or stops again: a crash loop) holds back the
+later priorities.
 
 It still does NOT automate the version-bump path (find-new-yunos +
 deactivate-snap after an install-binary) — that is a node-wide bounce with
@@ -83,78 +107,39 @@ See yunos/c/yuno_agent/YUNO_LIFECYCLE.md §6.5/§6.6.
 """
 
 import argparse
+import hashlib
+import io
+import itertools
 import json
+import mmap
 import os
 import re
 import shutil
+import struct
 import subprocess
 import sys
+import threading
 import time
-import urllib.error
-import urllib.parse
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-# ----------------------------------------------------------------------------
-#   ANSI colours (only when stdout is a tty)
-# ----------------------------------------------------------------------------
-_TTY = sys.stdout.isatty()
-
-
-def c(code, s):
-    if not _TTY:
-        return s
-    return "\033[%sm%s\033[0m" % (code, s)
-
-
-def bold(s):
-    return c("1", s)
-
-
-def green(s):
-    return c("32", s)
-
-
-def yellow(s):
-    return c("33", s)
-
-
-def red(s):
-    return c("31", s)
-
-
-def cyan(s):
-    return c("36", s)
-
-
-def dim(s):
-    return c("90", s)
-
+try:
+    from .agent_client import (
+        add_connection_args, ask, bold, connect, cyan, dim, file_key, green,
+        load_json_cache, parse_leading_json, red, report_ready, save_json_cache,
+        wait_yunos_ready, yellow,
+    )
+except ImportError:
+    # Run as a script (./sync_binaries.py): agent_client.py is beside it.
+    from agent_client import (
+        add_connection_args, ask, bold, connect, cyan, dim, file_key, green,
+        load_json_cache, parse_leading_json, red, report_ready, save_json_cache,
+        wait_yunos_ready, yellow,
+    )
 
 # ----------------------------------------------------------------------------
 #   Version comparison
 # ----------------------------------------------------------------------------
-_ANSI_RE = re.compile(r"\033\[[0-9;]*m")
-
-
-def parse_leading_json(text):
-    """
-    ycommand wraps the JSON payload with a leading blank line and a trailing
-    coloured footer (the command name). Strip ANSI, locate the first '[' or '{'
-    and decode just that value, ignoring whatever trails it.
-    """
-    clean = _ANSI_RE.sub("", text or "")
-    start = None
-    for i, ch in enumerate(clean):
-        if ch in "[{":
-            start = i
-            break
-    if start is None:
-        raise json.JSONDecodeError("no JSON value found", clean, 0)
-    obj, _ = json.JSONDecoder().raw_decode(clean[start:])
-    return obj
-
-
 def version_tuple(v):
     """
     Turn '7.4.5' or '1.4.4.0' into a comparable tuple of ints. Non-numeric
@@ -228,110 +213,6 @@ def local_is_newer(lb, ref_time, ref_date):
     return is_newer_build(lb.get("date"), ref_date)
 
 
-# ----------------------------------------------------------------------------
-#   OAuth2 — log in ONCE, reuse the token on every ycommand call
-# ----------------------------------------------------------------------------
-#   ycommand reads its credentials only from argp and does NOT cache a token
-#   between one-shot `-c` invocations, so passing -x/-X would re-run the
-#   password grant on every call. Instead we log in once here (Keycloak
-#   password grant), then thread the resulting jwt through `-j` to every
-#   invocation. This is what lets these scripts drive a REMOTE wss:// agent
-#   with SSH disabled. Stdlib only — no external deps.
-def _http_json(url, data=None, timeout=30):
-    """GET (data=None) or form-urlencoded POST, returning parsed JSON."""
-    body = None
-    headers = {}
-    if data is not None:
-        body = urllib.parse.urlencode(data).encode("utf-8")
-        headers["Content-Type"] = "application/x-www-form-urlencoded"
-    req = urllib.request.Request(url, data=body, headers=headers)
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
-
-
-def discover_token_endpoint(issuer, timeout=30):
-    """Read token_endpoint from the issuer's OIDC discovery document."""
-    doc = _http_json(issuer.rstrip("/") + "/.well-known/openid-configuration",
-                     timeout=timeout)
-    ep = doc.get("token_endpoint")
-    if not ep:
-        raise RuntimeError("OIDC discovery document has no token_endpoint")
-    return ep
-
-
-def obtain_jwt(args):
-    """
-    Return one jwt to reuse on every ycommand call, or None for a local/
-    unauthenticated run:
-      * --jwt given                                 -> used verbatim.
-      * user-id + passw + (issuer | token-endpoint) -> password grant, once.
-      * otherwise                                   -> None (local ws:// needs none).
-    """
-    if args.jwt:
-        return args.jwt
-    if not (args.user_id and args.user_passw and (args.issuer or args.token_endpoint)):
-        return None
-    token_endpoint = args.token_endpoint or discover_token_endpoint(args.issuer)
-    form = {
-        "grant_type": "password",
-        "client_id": args.client_id or "",
-        "username": args.user_id,
-        "password": args.user_passw,
-    }
-    if args.client_secret:
-        form["client_secret"] = args.client_secret
-    print(dim("authenticating once at %s ..." % token_endpoint))
-    try:
-        tok = _http_json(token_endpoint, data=form)
-    except urllib.error.HTTPError as e:
-        detail = ""
-        try:
-            detail = e.read().decode("utf-8", "replace")
-        except Exception:
-            pass
-        print(red("ERROR: OAuth2 login failed (HTTP %s): %s" % (e.code, detail or e.reason)))
-        sys.exit(2)
-    except Exception as e:
-        print(red("ERROR: OAuth2 login failed: %s" % e))
-        sys.exit(2)
-    jwt = tok.get("access_token")
-    if not jwt:
-        print(red("ERROR: token endpoint returned no access_token."))
-        sys.exit(2)
-    return jwt
-
-
-#   TLS flags for a wss:// agent, set once in main() and used by every call.
-#   The agent serves one long-life certificate of its own on every node, so
-#   the name never matches the host dialed: --ssl-server-name says which name
-#   to check the certificate against, and the chain is still validated.
-TLS_FLAGS = []
-
-
-def ycmd_base(ycommand, url, jwt):
-    """Base ycommand argv: binary + optional -u url + optional -j jwt + TLS."""
-    cmd = [ycommand]
-    if url:
-        cmd += ["-u", url]
-    if jwt:
-        cmd += ["-j", jwt]
-    cmd += TLS_FLAGS
-    return cmd
-
-
-def set_tls_flags(args):
-    """Record the TLS flags of the run, from the parsed arguments."""
-    global TLS_FLAGS
-    flags = []
-    trusted = getattr(args, "ssl_trusted_certificate", None)
-    if trusted:
-        flags += ["--ssl-trusted-certificate", trusted]
-    server_name = getattr(args, "ssl_server_name", None)
-    if server_name:
-        flags += ["--ssl-server-name", server_name]
-    TLS_FLAGS = flags
-
-
 # ----------------------------------------------------------------------------
 #   Discovery
 # ----------------------------------------------------------------------------
@@ -352,29 +233,259 @@ def find_yunetas_base():
     return os.path.dirname(os.path.dirname(here))
 
 
-def local_binaries(yunos_dir):
+#   How many --print-role probes run at the same time. Each one is a yuno
+#   starting up just far enough to print its role: the work is in the child,
+#   so threads are enough, and a few more than the CPUs cover the time each
+#   child spends waiting on the disk.
+PROBE_JOBS = min(16, max(4, os.cpu_count() or 1))
+
+
+#   A yuno can carry its --print-role record in an ELF section of its own,
+#   NUL-terminated JSON, e.g.
+#
+#       __attribute__((section(".yuneta_role"), used))
+#       static const char yuneta_role[] = "{\"role\":\"...\",\"version\":\"...\"}";
+#
+#   Reading it costs an mmap and a walk of the section headers: nothing is
+#   executed, so it is instant, needs no runnable binary (a cross build for
+#   another arch reads the same) and no yuno init. Without the section the
+#   binary is run with --print-role as before.
+YUNETA_ROLE_SECTION = b".yuneta_role"
+
+_SHT_NOBITS = 8
+
+
+def read_embedded_role(path):
     """
-    Return {role: {version, date, size, path, file}} for every executable
-    regular file in outputs/yunos, queried via --print-role.
+    The role record in the YUNETA_ROLE_SECTION of an ELF file (32/64-bit,
+    either byte order), or None when the file is not ELF, has no such section
+    or its content does not decode.
     """
-    out = {}
-    for name in sorted(os.listdir(yunos_dir)):
-        path = os.path.join(yunos_dir, name)
-        if not os.path.isfile(path) or not os.access(path, os.X_OK):
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 64:
+                return None
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        return _elf_role_section(m)
+    except (struct.error, IndexError, ValueError):
+        return None
+    finally:
+        m.close()
+
+
+def _elf_role_section(m):
+    if m[:4] != b"\x7fELF":
+        return None
+    is64 = m[4] == 2
+    endian = "<" if m[5] == 1 else ">"
+    if is64:
+        shoff, = struct.unpack_from(endian + "Q", m, 0x28)
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", m, 0x3A)
+        sh_fmt = endian + "IIQQQQ"          # name, type, flags, addr, offset, size
+    else:
+        shoff, = struct.unpack_from(endian + "I", m, 0x20)
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", m, 0x2E)
+        sh_fmt = endian + "IIIIII"
+    if not shoff:
+        return None
+
+    def section(i):
+        name, stype, _, _, offset, size = struct.unpack_from(sh_fmt, m, shoff + i * shentsize)
+        return name, stype, offset, size
+
+    if shnum == 0:
+        # More than 0xff00 sections: the count is in section 0's sh_size.
+        shnum = section(0)[3]
+    if shstrndx == 0xFFFF:
+        # SHN_XINDEX: the index is in section 0's sh_link.
+        link_at = shoff + (0x28 if is64 else 0x18)
+        shstrndx, = struct.unpack_from(endian + "I", m, link_at)
+
+    _, _, str_off, str_size = section(shstrndx)
+    wanted = YUNETA_ROLE_SECTION + b"\0"
+    for i in range(shnum):
+        name, stype, offset, size = section(i)
+        if stype == _SHT_NOBITS or name >= str_size:
             continue
-        try:
-            res = subprocess.run(
-                [path, "--print-role"],
-                capture_output=True, text=True, timeout=20,
-            )
-        except (OSError, subprocess.SubprocessError) as e:
-            print(red("  ! %s: cannot run --print-role (%s)" % (name, e)))
+        if m[str_off + name:str_off + name + len(wanted)] != wanted:
+            continue
+        raw = m[offset:offset + size].split(b"\0", 1)[0]
+        info = parse_leading_json(raw.decode("utf-8", "replace"))
+        return info if isinstance(info, dict) else None
+    return None
+
+
+def probe_role(path):
+    """
+    Read the role record of `path`: from its embedded section when it has one,
+    else by running `path --print-role`. Returns (info, error): the decoded
+    role record, or None and the reason it could not be read.
+    """
+    info = read_embedded_role(path)
+    if info is not None:
+        return info, None
+    try:
+        res = subprocess.run(
+            [path, "--print-role"],
+            capture_output=True, text=True, timeout=20,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        return None, "cannot run --print-role (%s)" % e
+    try:
+        return parse_leading_json(res.stdout), None
+    except json.JSONDecodeError:
+        return None, "--print-role did not return JSON, skipped"
+
+
+#   What --print-role said about each binary, and its digest, kept across
+#   runs: a binary that has not changed (same file_key()) is not run again, so
+#   a repeated dry-run probes nothing. Bounded: the least recently used entries
+#   go first. --no-cache neither reads nor writes it.
+PRINT_ROLE_CACHE = os.path.join(os.path.expanduser("~"), ".yuneta", "cache", "print_role.json")
+PRINT_ROLE_CACHE_MAX = 512
+
+
+def load_role_cache():
+    """The --print-role cache ({path: entry}); {} if missing or unreadable."""
+    return load_json_cache(PRINT_ROLE_CACHE)
+
+
+def save_role_cache(entries):
+    """Write the cache back, evicting the least recently used beyond the bound."""
+    save_json_cache(PRINT_ROLE_CACHE, _bounded(entries, PRINT_ROLE_CACHE_MAX))
+
+
+def _bounded(entries, bound):
+    """`entries` without the least recently used ones beyond `bound`."""
+    if len(entries) <= bound:
+        return entries
+    keep = sorted(entries, key=lambda k: entries[k].get("used", 0), reverse=True)
+    return dict((k, entries[k]) for k in keep[:bound])
+
+
+def file_digest(path):
+    """'blake2b:<hex>' of the content of `path`, or None if it cannot be read."""
+    h = hashlib.blake2b(digest_size=32)
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    h.update(m)
+    except (OSError, ValueError):
+        return None
+    return "blake2b:" + h.hexdigest()
+
+
+#   The content digest of every binary this tool pushed, per agent slot
+#   ("<url>|<role>|<version>"), with the size and time the agent reported for
+#   the slot right after. While the slot still shows that size and time it
+#   holds exactly those bytes, so the local build is compared by content
+#   instead of by size and mtime: a `touch`, a copy or a checkout that only
+#   moved the file time is not a REBUILD, and a rebuild that kept both the byte
+#   count and an older time is.
+PUSHED_DIGESTS = os.path.join(os.path.expanduser("~"), ".yuneta", "cache", "pushed_binaries.json")
+PUSHED_DIGESTS_MAX = 2048
+
+
+def pushed_slots(url):
+    """The recorded pushes to the agent at `url`: {"<role>|<version>": entry}."""
+    prefix = "%s|" % (url or "default")
+    return dict(
+        (k[len(prefix):], e) for k, e in load_json_cache(PUSHED_DIGESTS).items()
+        if k.startswith(prefix) and isinstance(e, dict)
+    )
+
+
+def record_pushed(session, url, rows):
+    """
+    Record the digest of each binary in `rows` just pushed, against the slot
+    the agent now reports for it. A slot that does not show the size pushed is
+    not recorded (something else wrote it).
+    """
+    instances = agent_binary_instances(session)
+    if not instances:
+        return
+    entries = load_json_cache(PUSHED_DIGESTS)
+    now = time.time()
+    for r in rows:
+        lb = r["local"]
+        slot = instances.get(r["role"], {}).get(lb["version"])
+        if not lb.get("digest") or not slot or slot["size"] != lb["size"]:
             continue
-        info = None
+        entries["%s|%s|%s" % (url or "default", r["role"], lb["version"])] = {
+            "digest": lb["digest"], "size": slot["size"], "time": slot.get("time"),
+            "used": now,
+        }
+    save_json_cache(PUSHED_DIGESTS, _bounded(entries, PUSHED_DIGESTS_MAX))
+
+
+def local_binaries(yunos_dir, cache=None):
+    """
+    Return {role: {version, date, size, digest, path, file}} for every
+    executable regular file in outputs/yunos, queried via --print-role
+    (PROBE_JOBS at a time; the warnings still come out in name order) and
+    hashed with file_digest().
+
+    With `cache` (see load_role_cache()) a binary whose file key is unchanged
+    is answered from it, digest included, and the ones probed are added to it.
+    """
+    names = []
+    for name in sorted(os.listdir(yunos_dir)):
+        path = os.path.join(yunos_dir, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            names.append(name)
+    if not names:
+        return {}
+
+    now = time.time()
+    results = {}
+    digests = {}
+    keys = {}
+    to_probe = []
+    to_hash = []
+    for name in names:
+        path = os.path.join(yunos_dir, name)
         try:
-            info = parse_leading_json(res.stdout)
-        except json.JSONDecodeError:
-            print(red("  ! %s: --print-role did not return JSON, skipped" % name))
+            keys[name] = file_key(path)
+        except OSError:
+            keys[name] = None
+        entry = cache.get(path) if cache is not None else None
+        if entry and keys[name] is not None and entry.get("key") == keys[name]:
+            entry["used"] = now
+            results[name] = (entry.get("info"), None)
+            digests[name] = entry.get("digest")
+            if not digests[name]:
+                to_hash.append(name)
+        else:
+            to_probe.append(name)
+            to_hash.append(name)
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=min(PROBE_JOBS, len(to_hash))) as pool:
+            # hashlib lets go of the GIL while it hashes a large buffer.
+            hashed = pool.map(file_digest, [os.path.join(yunos_dir, n) for n in to_hash])
+            probes = pool.map(probe_role, [os.path.join(yunos_dir, n) for n in to_probe])
+            digests.update(zip(to_hash, hashed))
+            results.update(zip(to_probe, probes))
+    if cache is not None:
+        for name in to_hash:
+            info = results[name][0]
+            if info is not None and keys[name] is not None:
+                cache[os.path.join(yunos_dir, name)] = {
+                    "key": keys[name], "info": info, "digest": digests[name], "used": now,
+                }
+        print(dim("  --print-role: %d probed, %d from the cache" % (
+            len(to_probe), len(names) - len(to_probe))))
+
+    out = {}
+    for name in names:
+        info, error = results[name]
+        path = os.path.join(yunos_dir, name)
+        if error:
+            print(red("  ! %s: %s" % (name, error)))
             continue
         role = info.get("role") or name
         if role != name:
@@ -392,28 +503,27 @@ def local_binaries(yunos_dir):
             "date": info.get("date", "?"),
             "mtime": mtime,          # local file mtime, vs the agent's `time`
             "size": os.path.getsize(path),
+            "digest": digests.get(name),
             "path": path,
         }
     return out
 
 
-def agent_binaries(ycommand, url, jwt):
+def agent_binaries(session):
     """
     Return {id: {version, size, date, binary}} from the agent via
     'ycommand -c *list-binaries' (the '*' forces raw JSON).
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-binaries"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
+        data = session.query("*list-binaries")
     except (OSError, subprocess.SubprocessError) as e:
         print(red("ERROR: cannot run ycommand: %s" % e))
         sys.exit(2)
-    try:
-        data = parse_leading_json(res.stdout)
-    except json.JSONDecodeError:
-        print(red("ERROR: '*list-binaries' did not return JSON. Is the agent up?"))
-        print(dim(res.stdout[:500]))
-        print(dim(res.stderr[:500]))
+    except json.JSONDecodeError as e:
+        print(red("ERROR: '*list-binaries' did not return JSON (ycommand exit %s). Is the agent up?"
+                  % getattr(e, "returncode", "?")))
+        print(dim(e.doc[:500]))
+        print(dim(getattr(e, "stderr", "")[:500]))
         sys.exit(2)
     if not isinstance(data, list):
         print(red("ERROR: unexpected '*list-binaries' payload (not a list)."))
@@ -428,12 +538,13 @@ def agent_binaries(ycommand, url, jwt):
             "size": rec.get("size", 0),
             "date": rec.get("date", "?"),
             "time": rec.get("time"),   # agent-reported file mtime (epoch), or None
+            "digest": rec.get("digest"),
             "binary": rec.get("binary", ""),
         }
     return out
 
 
-def agent_binary_instances(ycommand, url, jwt):
+def agent_binary_instances(session):
     """
     Return {role: {version: size}} for EVERY installed slot, via
     'ycommand -c *list-binaries-instances' (the '*' forces raw JSON).
@@ -446,10 +557,8 @@ def agent_binary_instances(ycommand, url, jwt):
 
     On any error returns {} so classify() degrades to the primary-only compare.
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-binaries-instances"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-        data = parse_leading_json(res.stdout)
+        data = session.query("*list-binaries-instances")
     except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
         return {}
     if not isinstance(data, list):
@@ -464,6 +573,7 @@ def agent_binary_instances(ycommand, url, jwt):
             "size": rec.get("size", 0),
             "date": rec.get("date", "?"),
             "time": rec.get("time"),   # agent-reported file mtime (epoch), or None
+            "digest": rec.get("digest"),
         }
     return out
 
@@ -471,7 +581,46 @@ def agent_binary_instances(ycommand, url, jwt):
 # ----------------------------------------------------------------------------
 #   Classification
 # ----------------------------------------------------------------------------
-def classify(local, agent, instances):
+def content_changed(lb, slot, pushed):
+    """
+    Whether the local build `lb` differs in content from the agent `slot`:
+    True/False, or None when there is no digest of the slot to compare with.
+
+    The slot's digest is the one the agent reports, if it reports one of the
+    same kind, else the one recorded when this tool pushed it (`pushed`, see
+    PUSHED_DIGESTS) as long as the slot still shows the size and time it had
+    then.
+    """
+    mine = lb.get("digest")
+    if not mine:
+        return None
+    theirs = slot.get("digest")
+    if theirs and theirs.split(":", 1)[0] == mine.split(":", 1)[0]:
+        return theirs != mine
+    if (pushed and pushed.get("digest")
+            and pushed.get("size") == slot.get("size")
+            and pushed.get("time") == slot.get("time")):
+        return pushed["digest"] != mine
+    return None
+
+
+def rebuild_reason(lb, slot, pushed):
+    """
+    Why the same-version local build `lb` should overwrite `slot`, or None
+    if it should not: "content" when a digest decides (content_changed()),
+    else "size", else "newer build" by the file mtime (local_is_newer()).
+    """
+    changed = content_changed(lb, slot, pushed)
+    if changed is not None:
+        return "content" if changed else None
+    if lb["size"] != slot["size"]:
+        return "size"
+    if local_is_newer(lb, slot.get("time"), slot.get("date")):
+        return "newer build"
+    return None
+
+
+def classify(local, agent, instances, pushed=None):
     """
     Drive from the AGENT's installed binaries (not from outputs/yunos): only
     roles the agent already manages on this node are candidates. For each one
@@ -480,9 +629,11 @@ def classify(local, agent, instances):
     `instances` is {role: {version: size}} from '*list-binaries-instances'; it
     guards the BUMP path so a version already installed as a non-primary slot
     (snap active / pending promote) is not offered to a doomed install-binary.
+    `pushed` is pushed_slots() for this agent.
 
     kind in {bump, installed, downgrade, rebuild, uptodate, nolocal}.
     """
+    pushed = pushed or {}
     rows = []
     for role, ab in sorted(agent.items()):
         lb = local.get(role)
@@ -501,19 +652,15 @@ def classify(local, agent, instances):
                 # is not the active primary (a snap is pinning an older one).
                 # install-binary would fail "Node already exists"; nothing to
                 # push — it only needs promotion (yunetas upgrade-yunos). If its
-                # content drifted (size differs, OR the local build is newer-
-                # dated than that slot) it is a same-version REBUILD of that slot
-                # instead, which update-binary overwrites in place.
-                slot = inst[lb["version"]]
-                if lb["size"] != slot["size"]:
+                # content drifted (see rebuild_reason()) it is a same-version
+                # REBUILD of that slot instead, which update-binary overwrites
+                # in place.
+                reason = rebuild_reason(
+                    lb, inst[lb["version"]], pushed.get("%s|%s" % (role, lb["version"])))
+                if reason:
                     rows.append({
                         "role": role, "kind": "rebuild", "action": "update-binary",
-                        "local": lb, "agent": ab, "reason": "size",
-                    })
-                elif local_is_newer(lb, slot.get("time"), slot.get("date")):
-                    rows.append({
-                        "role": role, "kind": "rebuild", "action": "update-binary",
-                        "local": lb, "agent": ab, "reason": "newer build",
+                        "local": lb, "agent": ab, "reason": reason,
                     })
                 else:
                     rows.append({
@@ -531,20 +678,17 @@ def classify(local, agent, instances):
                 "local": lb, "agent": ab,
             })
         else:
-            # Same version. Worth an update-binary if the content changed. Size
-            # is the cheap signal; a rebuild that doesn't move the byte count
-            # (a one-char log edit, or a relink) is caught by comparing the file
+            # Same version. Worth an update-binary if the content changed: by
+            # digest when the slot's is known, else by size, else by the file
             # mtime — the agent's `time` vs the local file's (or the embedded
-            # build `date` when the agent predates `time`).
-            if lb["size"] != ab["size"]:
-                rows.append({
-                    "role": role, "kind": "rebuild", "action": "update-binary",
-                    "local": lb, "agent": ab, "reason": "size",
-                })
-            elif local_is_newer(lb, ab.get("time"), ab.get("date")):
+            # build `date` when the agent predates `time`), which catches a
+            # rebuild that doesn't move the byte count (a one-char log edit,
+            # or a relink).
+            reason = rebuild_reason(lb, ab, pushed.get("%s|%s" % (role, lb["version"])))
+            if reason:
                 rows.append({
                     "role": role, "kind": "rebuild", "action": "update-binary",
-                    "local": lb, "agent": ab, "reason": "newer build",
+                    "local": lb, "agent": ab, "reason": reason,
                 })
             else:
                 rows.append({
@@ -598,6 +742,8 @@ def print_table(rows, show_uptodate):
         if kind == "rebuild" and r.get("reason") == "newer build":
             stamp = _short_mtime(r["local"].get("mtime")) if r["local"] else ""
             note = dim("newer build" + (" (%s)" % stamp if stamp else ""))
+        elif kind == "rebuild" and r.get("reason") == "content":
+            note = dim("content changed")
         print("%-18s %s %-12s %-12s %-9s %-15s %s" % (
             r["role"],
             colour("%-11s" % label),
@@ -609,15 +755,14 @@ def print_table(rows, show_uptodate):
 # ----------------------------------------------------------------------------
 #   Execution
 # ----------------------------------------------------------------------------
-def run_ycmd(ycommand, url, jwt, cmd_str, dry_run, timeout=120):
+def run_ycmd(session, cmd_str, dry_run, timeout=120):
     """Run one `ycommand -c '<cmd_str>'`, echoing it. Returns (ok, stdout)."""
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", cmd_str]
     print(cyan(">> ycommand -c '%s'" % cmd_str))
     if dry_run:
         print(dim("   (dry-run, not executed)"))
         return True, ""
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=timeout)
+        res = session.run(cmd_str, timeout=timeout)
     except (OSError, subprocess.SubprocessError) as e:
         print(red("   ERROR: %s" % e))
         return False, ""
@@ -641,17 +786,15 @@ def run_ycmd(ycommand, url, jwt, cmd_str, dry_run, timeout=120):
     return ok, out
 
 
-def yuno_states(ycommand, url, jwt, role):
+def yuno_states(session, role, fresh=False):
     """
     Return the list of instance records for `role` via '*list-yunos
     yuno_role=R'. Each record carries yuno_running / yuno_playing. A role may
     have several instances (one per realm); they all share the one slot.
     Returns [] on any error — the caller treats "unknown" as "not running".
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-yunos yuno_role=%s" % role]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-        data = parse_leading_json(res.stdout)
+        data = session.query("*list-yunos yuno_role=%s" % role, fresh=fresh)
     except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
         return []
     if not isinstance(data, list):
@@ -659,18 +802,19 @@ def yuno_states(ycommand, url, jwt, role):
     return [r for r in data if isinstance(r, dict)]
 
 
-def agent_start_priorities(ycommand, url, jwt):
+def agent_start_priorities(session):
     """
     Return {role: start_priority} from '*list-yunos', taking the LOWEST
     start_priority among a role's instances (its most-infrastructure instance
     sets the role's restart rank). The agent owns this number; we order
     restarts by it instead of alphabetically. Instances that predate the column
     default to 5. {} on any error — the caller then defaults every role to 5.
+
+    Asked fresh: the *list-yunos of the snapshot was read before the prompt,
+    and yunos may have been started or stopped while it waited.
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-yunos"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-        data = parse_leading_json(res.stdout)
+        data = session.query("*list-yunos", fresh=True)
     except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
         return {}
     if not isinstance(data, list):
@@ -691,32 +835,31 @@ def agent_start_priorities(ycommand, url, jwt):
     return out
 
 
-def wait_until_stopped(ycommand, url, jwt, role, timeout_s=15.0, poll_s=0.3):
+def wait_until_stopped(session, role, timeout_s=15.0):
     """
-    Poll '*list-yunos yuno_role=R' until no instance reports yuno_running, so
-    the executable is unmapped before update-binary overwrites its slot
-    (otherwise the copy hits text-file-busy again). Returns True if stopped.
+    Poll '*list-yunos yuno_role=R' (with backoff, see AgentSession.poll())
+    until no instance reports yuno_running, so the executable is unmapped
+    before update-binary overwrites its slot (otherwise the copy hits
+    text-file-busy again). Returns True if stopped.
     """
-    deadline = time.monotonic() + timeout_s
-    while time.monotonic() < deadline:
-        states = yuno_states(ycommand, url, jwt, role)
-        if not any(s.get("yuno_running") for s in states):
-            return True
-        time.sleep(poll_s)
-    return False
+    def stopped(data):
+        records = data if isinstance(data, list) else []
+        return not any(isinstance(r, dict) and r.get("yuno_running") for r in records)
+
+    return session.poll("*list-yunos yuno_role=%s" % role, stopped, timeout=timeout_s)
 
 
-def deploy_install(ycommand, url, jwt, action, role, dry_run):
+def deploy_install(session, action, role, dry_run):
     """install-binary / update-binary with NO lifecycle (--no-restart, or bump)."""
     ok, _ = run_ycmd(
-        ycommand, url, jwt,
+        session,
         "%s id=%s content64=$$(%s)" % (action, role, role),
         dry_run,
     )
     return ok
 
 
-def deploy_update_with_restart(ycommand, url, jwt, role, local_version, dry_run):
+def deploy_update_with_restart(session, role, local_version, dry_run, wait_ready=None):
     """
     Same-version REBUILD hot-patch, scoped to `role`: stop the running
     instance(s) so the slot is free, overwrite it, then restore each
@@ -731,8 +874,17 @@ def deploy_update_with_restart(ycommand, url, jwt, role, local_version, dry_run)
     executing, so the kill/restart cycle is skipped and update-binary writes
     in place. An instance with no role_version (predates the column) is treated
     as on-target, so we kill on the safe side rather than risk text-file-busy.
+
+    With `wait_ready` (seconds) the instances stopped are waited for until
+    they report running again, and playing if they were (wait_yunos_ready());
+    one that does not come up fails the role.
+
+    Returns (ok, downtime, ready): downtime is the seconds from the kill until
+    the restored instance(s) answered run/play, or were ready when waited
+    for, None when nothing was stopped; ready is True/False when waited for,
+    else None.
     """
-    states = yuno_states(ycommand, url, jwt, role)
+    states = yuno_states(session, role)
 
     def on_target(s):
         rv = str(s.get("role_version", "")).strip()
@@ -750,41 +902,113 @@ def deploy_update_with_restart(ycommand, url, jwt, role, local_version, dry_run)
             "   running version differs from the rebuilt %s; update-binary in "
             "place (no kill/restart)" % local_version))
 
+    t_down = None
     if was_running:
         # Orderly shutdown (SIGQUIT, not force) so the gbmem audit runs.
-        run_ycmd(ycommand, url, jwt, "kill-yuno yuno_role=%s" % role, dry_run)
-        if not dry_run and not wait_until_stopped(ycommand, url, jwt, role):
+        t_down = time.monotonic()
+        run_ycmd(session, "kill-yuno yuno_role=%s" % role, dry_run)
+        if not dry_run and not wait_until_stopped(session, role):
             print(yellow(
                 "   ! %s still running after kill; update-binary may hit "
                 "text-file-busy" % role))
 
     ok, _ = run_ycmd(
-        ycommand, url, jwt,
+        session,
         "update-binary id=%s content64=$$(%s)" % (role, role),
         dry_run,
     )
 
     # Restore prior state even if the update failed, so we never leave a yuno
     # we stopped lying dead (it comes back on the old binary in that case).
+    downtime = None
+    ready = None
     if was_running:
-        run_ycmd(ycommand, url, jwt, "run-yuno yuno_role=%s play=0" % role, dry_run)
+        run_ycmd(session, "run-yuno yuno_role=%s play=0" % role, dry_run)
         if was_playing:
-            run_ycmd(ycommand, url, jwt, "play-yuno yuno_role=%s" % role, dry_run)
+            run_ycmd(session, "play-yuno yuno_role=%s" % role, dry_run)
+        if wait_ready and not dry_run:
+            want = dict(
+                (str(s.get("id")), bool(s.get("yuno_playing")))
+                for s in states if s.get("yuno_running") and on_target(s))
+            ready = report_ready(
+                role, *wait_yunos_ready(
+                    session, "*list-yunos yuno_role=%s" % role, want, wait_ready))
+            ok = ok and ready
+        if not dry_run:
+            downtime = time.monotonic() - t_down
+            print(dim("   %s down for %.1fs" % (role, downtime)))
+
+    return ok, downtime, ready
+
+
+def deploy_one(session, r, args):
+    """Push one chosen row, with the restart cycle unless --no-restart."""
+    if r["action"] == "update-binary" and not args.no_restart:
+        ok, r["downtime"], r["ready"] = deploy_update_with_restart(
+            session, r["role"], r["local"]["version"], args.dry_run, args.wait_ready)
+        return ok
+    return deploy_install(session, r["action"], r["role"], args.dry_run)
+
+
+class _ThreadOutput(object):
+    """
+    Stands in for sys.stdout while a tier deploys in threads: what a thread
+    prints goes to its own `buffer` when it has one, else straight through.
+    """
 
-    return ok
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buf = getattr(self.local, "buffer", None)
+        return (buf if buf is not None else self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def deploy_tier(session, rows, args):
+    """
+    Deploy `rows`, the chosen roles of one start_priority tier, up to
+    --parallel at a time. Each role's output is held back and printed as one
+    block when it is done, so the logs of side-by-side restarts do not
+    interleave. Returns the successes, in the order of `rows`.
+    """
+    if args.parallel <= 1 or len(rows) == 1:
+        return [deploy_one(session, r, args) for r in rows]
+
+    out = _ThreadOutput(sys.stdout)
 
+    def one(r):
+        out.local.buffer = io.StringIO()
+        try:
+            return deploy_one(session, r, args), out.local.buffer.getvalue()
+        finally:
+            out.local.buffer = None
 
-def ask(prompt):
+    results = {}
+    sys.stdout = out
     try:
-        return input(prompt).strip().lower()
-    except EOFError:
-        return "q"
+        with ThreadPoolExecutor(max_workers=min(args.parallel, len(rows))) as pool:
+            futures = dict((pool.submit(one, r), i) for i, r in enumerate(rows))
+            for fut in as_completed(futures):
+                success, text = fut.result()
+                out.stream.write(text)
+                out.stream.flush()
+                results[futures[fut]] = success
+    finally:
+        sys.stdout = out.stream
+    return [results[i] for i in range(len(rows))]
 
 
 # ----------------------------------------------------------------------------
 #   Main
 # ----------------------------------------------------------------------------
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser(
         description="Compare outputs/yunos binaries with the agent and push updates.")
     ap.add_argument("-u", "--url", default=None,
@@ -799,33 +1023,27 @@ def main():
                     help="show what would run, execute nothing.")
     ap.add_argument("--show-uptodate", action="store_true",
                     help="also list binaries already in sync.")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="run --print-role on every binary; do not read or write "
+                         "the cache of previous answers (%s)." % PRINT_ROLE_CACHE)
+    ap.add_argument("-p", "--parallel", type=int, default=1, metavar="N",
+                    help="deploy up to N roles of the same start_priority at "
+                         "the same time; the next priority waits for them "
+                         "(default: 1, one role at a time).")
+    ap.add_argument("--wait-ready", type=float, nargs="?", const=60.0, default=None,
+                    metavar="SECONDS",
+                    help="after restarting a REBUILD, wait (up to SECONDS, default "
+                         "60) for its instances to be running and playing again; a "
+                         "role that does not come up fails, and later "
+                         "start_priorities are not deployed.")
     ap.add_argument("--no-restart", action="store_true",
                     help="for same-version REBUILDs, do NOT kill/restart the "
                          "running yuno; run update-binary only and print the "
                          "manual reminder (old behaviour).")
-    auth = ap.add_argument_group(
-        "OAuth2 (remote wss:// agent; logs in ONCE, reuses the token via -j)")
-    auth.add_argument("-I", "--issuer", default=None,
-                      help="OIDC issuer for discovery, e.g. "
-                           "https://auth.artgins.com/realms/artgins")
-    auth.add_argument("-T", "--token-endpoint", default=None,
-                      help="explicit token endpoint (skips discovery).")
-    auth.add_argument("-Z", "--client-id", default=None, help="OAuth2 client_id.")
-    auth.add_argument("--client-secret", default=None,
-                      help="OAuth2 client_secret (confidential client only).")
-    auth.add_argument("-x", "--user-id", default=None, help="OAuth2 username.")
-    auth.add_argument("-X", "--user-passw", default=None, help="OAuth2 password.")
-    auth.add_argument("-j", "--jwt", default=None,
-                      help="reuse this jwt directly (skip the login).")
-
-    tls = ap.add_argument_group("TLS (wss:// agent)")
-    tls.add_argument("--ssl-trusted-certificate", default=None,
-                     help="PEM of the CA that signs the agent certificate.")
-    tls.add_argument("--ssl-server-name", default=None,
-                     help="name to check the agent certificate against "
-                          "(default: the host of the url).")
-    args = ap.parse_args()
-    set_tls_flags(args)
+    add_connection_args(ap)
+    args = ap.parse_args(argv)
+    if args.parallel < 1:
+        ap.error("--parallel must be at least 1")
 
     ycommand = args.ycommand or shutil.which("ycommand")
     if not ycommand:
@@ -838,23 +1056,31 @@ def main():
         print(red("ERROR: yunos dir not found: %s" % yunos_dir))
         sys.exit(2)
 
-    jwt = obtain_jwt(args)
+    session = connect(ycommand, args)
 
     print(dim("yunetas base : %s" % base))
     print(dim("yunos dir    : %s" % yunos_dir))
     print(dim("ycommand     : %s%s%s" % (
         ycommand,
         ("  url=" + args.url) if args.url else "",
-        "  oauth2=on" if jwt else "")))
-
-    print(dim("\nreading agent binaries (*list-binaries)..."))
-    agent = agent_binaries(ycommand, args.url, jwt)
-    print(dim("reading installed slots (*list-binaries-instances)..."))
-    instances = agent_binary_instances(ycommand, args.url, jwt)
-    print(dim("reading local binaries (--print-role)..."))
-    local = local_binaries(yunos_dir)
-
-    rows = classify(local, agent, instances)
+        "  oauth2=on" if session.jwt else "")))
+
+    # The agent listings and the local --print-role probes do not depend on
+    # each other: run them at the same time, join both for classify().
+    print(dim("\nreading the agent (*list-binaries, *list-binaries-instances, *list-yunos)"
+              "\nand the local binaries (--print-role)..."))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        listing = pool.submit(
+            session.snapshot, ["*list-binaries", "*list-binaries-instances", "*list-yunos"])
+        cache = None if args.no_cache else load_role_cache()
+        local = local_binaries(yunos_dir, cache)
+        if cache is not None:
+            save_role_cache(cache)
+        listing.result()
+    agent = agent_binaries(session)
+    instances = agent_binary_instances(session)
+
+    rows = classify(local, agent, instances, pushed_slots(args.url))
     print_table(rows, show_uptodate=args.show_uptodate or args.dry_run)
 
     installed = [r for r in rows if r["kind"] == "installed"]
@@ -918,24 +1144,53 @@ def main():
     # Deploy in ascending start_priority order so a same-version REBUILD brings
     # infrastructure (logcenter/emailsender/auth_bff) back before gates and dba.
     # Harmless for installs (no restart). Single source of truth: the agent.
-    prio_map = agent_start_priorities(ycommand, args.url, jwt)
+    prio_map = agent_start_priorities(session)
     chosen.sort(key=lambda r: (prio_map.get(r["role"], 5), r["role"]))
 
+    # With --parallel the roles of one tier go side by side; the next tier
+    # starts once every role of this one is back (deploy_one() returns after
+    # the run/play that restores it).
+    # With --wait-ready a tier whose roles did not all come back up stops the
+    # run there: what starts later depends on it.
     print()
     ok, fail = 0, 0
-    for r in chosen:
-        if r["action"] == "update-binary" and not args.no_restart:
-            success = deploy_update_with_restart(
-                ycommand, args.url, jwt, r["role"], r["local"]["version"], args.dry_run)
-        else:
-            success = deploy_install(
-                ycommand, args.url, jwt, r["action"], r["role"], args.dry_run)
-        if success:
-            ok += 1
-        else:
-            fail += 1
+    pushed = []
+    held = []
+    halted = False
+    for prio, tier in itertools.groupby(chosen, key=lambda r: prio_map.get(r["role"], 5)):
+        tier = list(tier)
+        if halted:
+            held += tier
+            continue
+        t0 = time.monotonic()
+        if args.parallel > 1 and len(tier) > 1:
+            print(bold("start_priority %d: %s" % (prio, ", ".join(r["role"] for r in tier))))
+        for r, success in zip(tier, deploy_tier(session, tier, args)):
+            if success:
+                ok += 1
+                pushed.append(r)
+            else:
+                fail += 1
+        if args.parallel > 1 and len(tier) > 1:
+            print(dim("start_priority %d done in %.1fs" % (prio, time.monotonic() - t0)))
+        halted = any(r.get("ready") is False for r in tier)
+    if held:
+        print(red("\nNot deployed, a lower start_priority did not come back up: %s" %
+                  ", ".join(r["role"] for r in held)))
+        fail += len(held)
+    if pushed and not args.dry_run:
+        record_pushed(session, args.url, pushed)
     print()
     print(bold("Done: %s, %s." % (green("%d ok" % ok), red("%d failed" % fail) if fail else dim("0 failed"))))
+    print(dim(session.describe_cost()))
+    downtimes = sorted(
+        ((r["downtime"], r["role"]) for r in chosen if r.get("downtime") is not None),
+        reverse=True)
+    if downtimes:
+        print(dim("downtime: " + ", ".join("%s %.1fs" % (role, d) for d, role in downtimes)))
+    not_ready = [r["role"] for r in chosen if r.get("ready") is False]
+    if not_ready:
+        print(red("not ready: %s" % ", ".join(not_ready)))
 
     # Lifecycle reminders / notes.
     did_update = any(r["action"] == "update-binary" for r in chosen)
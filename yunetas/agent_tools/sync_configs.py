@@ -53,6 +53,17 @@ Classification
 A DOWNGRADE is never offered for install: seeding a stale version with
 create-config would break the version logic, so it is reported and left alone.
 
+"Identical content" is compared by digest: the blake2b of the canonical JSON
+(sorted keys, compact, ``1.0`` as ``1``) of the local file and of the agent's
+``zcontent``. What a file parsed to is kept between runs, per directory, under
+``~/.yuneta/cache/configs/``: a file that has not changed (same device, inode,
+size, mtime and ctime) is not parsed again (``--no-cache`` to parse them all).
+The agent's ``zcontent`` is reduced to its digest as soon as it is read;
+``--diff`` asks the agent again, for the UPDATE rows only, to show what changed
+(secret fields masked). ``*list-configs`` itself still carries every content:
+the agent has no digest-only listing. A ``digest`` field in it would be used
+instead of hashing the content.
+
 Like ``*list-binaries``, ``*list-configs`` reports only the primary (id,version);
 if a freshly built config's version is already created as a non-primary record,
 create-config would fail "already exists". The instance list from
@@ -96,10 +107,16 @@ and are never auto-restarted — their ids are printed as a reminder.
 
 The affected yunos are restarted in ascending ``start_priority`` order (read
 from the agent's ``*list-yunos`` record), so infrastructure comes back before
-its dependents instead of in alphabetical id order.
+its dependents instead of in alphabetical id order. ``--wait-ready`` makes that
+order hold: each restarted yuno is waited for until it reports running (and
+playing, if it was) with its time to ready, a yuno that stops again right
+after starting is reported as a crash loop, and one that does not come up
+holds back the restarts of the later start_priorities.
 """
 
 import argparse
+import difflib
+import hashlib
 import json
 import os
 import re
@@ -109,122 +126,93 @@ import stat
 import subprocess
 import tempfile
 import sys
-import time
-import urllib.error
-import urllib.parse
-import urllib.request
-
-# ----------------------------------------------------------------------------
-#   ANSI colours (only when stdout is a tty)
-# ----------------------------------------------------------------------------
-_TTY = sys.stdout.isatty()
-
-
-def c(code, s):
-    if not _TTY:
-        return s
-    return "\033[%sm%s\033[0m" % (code, s)
-
-
-def bold(s):
-    return c("1", s)
-
-
-def green(s):
-    return c("32", s)
-
-
-def yellow(s):
-    return c("33", s)
-
-
-def red(s):
-    return c("31", s)
-
-
-def cyan(s):
-    return c("36", s)
-
-
-def dim(s):
-    return c("90", s)
 
+try:
+    from .agent_client import (
+        add_connection_args, ask, bold, connect, cyan, dim, file_key, green,
+        load_json_cache, red, report_ready, save_json_cache, wait_yunos_ready,
+        yellow,
+    )
+except ImportError:
+    # Run as a script (./sync_configs.py): agent_client.py is beside it.
+    from agent_client import (
+        add_connection_args, ask, bold, connect, cyan, dim, file_key, green,
+        load_json_cache, red, report_ready, save_json_cache, wait_yunos_ready,
+        yellow,
+    )
 
 # ----------------------------------------------------------------------------
 #   JSON helpers
 # ----------------------------------------------------------------------------
-_ANSI_RE = re.compile(r"\033\[[0-9;]*m")
-
-
-def parse_leading_json(text):
-    """
-    ycommand wraps the JSON payload with a leading blank line and a trailing
-    coloured footer (the command name). Strip ANSI, locate the first '[' or '{'
-    and decode just that value, ignoring whatever trails it.
-    """
-    clean = _ANSI_RE.sub("", text or "")
-    start = None
-    for i, ch in enumerate(clean):
-        if ch in "[{":
-            start = i
-            break
-    if start is None:
-        raise json.JSONDecodeError("no JSON value found", clean, 0)
-    obj, _ = json.JSONDecoder().raw_decode(clean[start:])
-    return obj
+#   One pass over a JSONC text: runs of JSON (strings whole, so a "//" or "/*"
+#   inside one is left alone) and the comments between them.
+_JSONC_RE = re.compile(
+    r'(?P<keep>(?:[^"/]+|"[^"\\\n]*(?:\\.[^"\\\n]*)*"|/(?![/*]))+)'
+    r'|//[^\n]*'
+    r'|/\*.*?(?:\*/|\Z)',
+    re.S,
+)
+_NOT_NEWLINE_RE = re.compile(r"[^\n]")
+
+
+def _blank_comment(m):
+    text = m.group(0)
+    if m.group("keep") is not None:
+        return text
+    if "\n" not in text:
+        return " " * len(text)
+    return _NOT_NEWLINE_RE.sub(" ", text)
 
 
 def strip_jsonc(text):
     """
-    Remove ``//`` line comments and ``/* */`` block comments that live OUTSIDE
-    of strings. Yuneta loads its configs with a non-strict parser
+    Blank out ``//`` line comments and ``/* */`` block comments that live
+    OUTSIDE of strings. Yuneta loads its configs with a non-strict parser
     (``config_gbuffer2json``) that tolerates comments, so a plain ``json.loads``
     would choke on otherwise-valid config files.
+
+    Comments become spaces (their newlines kept), so every line and column of
+    the result is the one of `text`: a JSON error in it points into the file.
     """
-    out = []
-    i, n = 0, len(text)
-    in_str = False
-    esc = False
-    while i < n:
-        ch = text[i]
-        if in_str:
-            out.append(ch)
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
-            elif ch == '"':
-                in_str = False
-            i += 1
-            continue
-        if ch == '"':
-            in_str = True
-            out.append(ch)
-            i += 1
-            continue
-        if ch == "/" and i + 1 < n and text[i + 1] == "/":
-            while i < n and text[i] != "\n":
-                i += 1
-            continue
-        if ch == "/" and i + 1 < n and text[i + 1] == "*":
-            i += 2
-            while i + 1 < n and not (text[i] == "*" and text[i + 1] == "/"):
-                i += 1
-            i += 2
-            continue
-        out.append(ch)
-        i += 1
-    return "".join(out)
+    return _JSONC_RE.sub(_blank_comment, text)
 
 
 def load_jsonc(path):
-    """Load a (possibly comment-bearing) JSON config file into a dict."""
+    """
+    Load a (possibly comment-bearing) JSON config file into a dict. Parsed
+    once: a text with no "/" cannot hold a comment and goes to ``json.loads``
+    as is. A JSONDecodeError gives the line and column in the file.
+    """
     with open(path, "r", encoding="utf-8") as f:
         text = f.read()
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        return json.loads(strip_jsonc(text))
+    if "/" in text:
+        text = strip_jsonc(text)
+    return json.loads(text)
+
+
+def _canonical(node):
+    """`node` with every integral float an int: 1.0 and 1 are one value."""
+    if isinstance(node, dict):
+        return dict((k, _canonical(v)) for k, v in node.items())
+    if isinstance(node, list):
+        return [_canonical(v) for v in node]
+    if isinstance(node, float) and node.is_integer():
+        return int(node)
+    return node
+
+
+def content_digest(content):
+    """
+    'blake2b:<hex>' of the canonical JSON of `content` (sorted keys, compact,
+    integral floats as ints), or None for None. Two configs are the same
+    content iff their digests are equal, whatever their key order, spacing
+    or comments.
+    """
+    if content is None:
+        return None
+    text = json.dumps(_canonical(content), sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False)
+    return "blake2b:" + hashlib.blake2b(text.encode("utf-8"), digest_size=32).hexdigest()
 
 
 def version_tuple(v):
@@ -248,110 +236,6 @@ def cmp_versions(a, b):
     return 0
 
 
-# ----------------------------------------------------------------------------
-#   OAuth2 — log in ONCE, reuse the token on every ycommand call
-# ----------------------------------------------------------------------------
-#   ycommand reads its credentials only from argp and does NOT cache a token
-#   between one-shot `-c` invocations, so passing -x/-X would re-run the
-#   password grant on every call. Instead we log in once here (Keycloak
-#   password grant), then thread the resulting jwt through `-j` to every
-#   invocation. This is what lets these scripts drive a REMOTE wss:// agent
-#   with SSH disabled. Stdlib only — no external deps.
-def _http_json(url, data=None, timeout=30):
-    """GET (data=None) or form-urlencoded POST, returning parsed JSON."""
-    body = None
-    headers = {}
-    if data is not None:
-        body = urllib.parse.urlencode(data).encode("utf-8")
-        headers["Content-Type"] = "application/x-www-form-urlencoded"
-    req = urllib.request.Request(url, data=body, headers=headers)
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
-
-
-def discover_token_endpoint(issuer, timeout=30):
-    """Read token_endpoint from the issuer's OIDC discovery document."""
-    doc = _http_json(issuer.rstrip("/") + "/.well-known/openid-configuration",
-                     timeout=timeout)
-    ep = doc.get("token_endpoint")
-    if not ep:
-        raise RuntimeError("OIDC discovery document has no token_endpoint")
-    return ep
-
-
-def obtain_jwt(args):
-    """
-    Return one jwt to reuse on every ycommand call, or None for a local/
-    unauthenticated run:
-      * --jwt given                                 -> used verbatim.
-      * user-id + passw + (issuer | token-endpoint) -> password grant, once.
-      * otherwise                                   -> None (local ws:// needs none).
-    """
-    if args.jwt:
-        return args.jwt
-    if not (args.user_id and args.user_passw and (args.issuer or args.token_endpoint)):
-        return None
-    token_endpoint = args.token_endpoint or discover_token_endpoint(args.issuer)
-    form = {
-        "grant_type": "password",
-        "client_id": args.client_id or "",
-        "username": args.user_id,
-        "password": args.user_passw,
-    }
-    if args.client_secret:
-        form["client_secret"] = args.client_secret
-    print(dim("authenticating once at %s ..." % token_endpoint))
-    try:
-        tok = _http_json(token_endpoint, data=form)
-    except urllib.error.HTTPError as e:
-        detail = ""
-        try:
-            detail = e.read().decode("utf-8", "replace")
-        except Exception:
-            pass
-        print(red("ERROR: OAuth2 login failed (HTTP %s): %s" % (e.code, detail or e.reason)))
-        sys.exit(2)
-    except Exception as e:
-        print(red("ERROR: OAuth2 login failed: %s" % e))
-        sys.exit(2)
-    jwt = tok.get("access_token")
-    if not jwt:
-        print(red("ERROR: token endpoint returned no access_token."))
-        sys.exit(2)
-    return jwt
-
-
-#   TLS flags for a wss:// agent, set once in main() and used by every call.
-#   The agent serves one long-life certificate of its own on every node, so
-#   the name never matches the host dialed: --ssl-server-name says which name
-#   to check the certificate against, and the chain is still validated.
-TLS_FLAGS = []
-
-
-def ycmd_base(ycommand, url, jwt):
-    """Base ycommand argv: binary + optional -u url + optional -j jwt + TLS."""
-    cmd = [ycommand]
-    if url:
-        cmd += ["-u", url]
-    if jwt:
-        cmd += ["-j", jwt]
-    cmd += TLS_FLAGS
-    return cmd
-
-
-def set_tls_flags(args):
-    """Record the TLS flags of the run, from the parsed arguments."""
-    global TLS_FLAGS
-    flags = []
-    trusted = getattr(args, "ssl_trusted_certificate", None)
-    if trusted:
-        flags += ["--ssl-trusted-certificate", trusted]
-    server_name = getattr(args, "ssl_server_name", None)
-    if server_name:
-        flags += ["--ssl-server-name", server_name]
-    TLS_FLAGS = flags
-
-
 # ----------------------------------------------------------------------------
 #   Discovery
 # ----------------------------------------------------------------------------
@@ -475,7 +359,9 @@ def apply_secret_overlays(local, secrets_dir, workdir):
 
     for cid, lc in sorted(local.items()):
         overlay_path = os.path.join(secrets_dir, "%s.json" % cid)
-        content = lc["content"]
+        if not lc["sentinels"] and not os.path.isfile(overlay_path):
+            continue    # nothing declared, nothing to merge
+        content = config_content(lc)
 
         # Which paths the committed config declares as credentials. Captured
         # BEFORE the merge, because afterwards the sentinel is gone and an
@@ -520,6 +406,7 @@ def apply_secret_overlays(local, secrets_dir, workdir):
             with os.fdopen(fd, "w") as f:
                 json.dump(content, f, indent=4)
             lc["content"] = content
+            lc["digest"] = content_digest(content)
             lc["path"] = merged_path
             lc["version"] = str(content.get("__version__", lc["version"]))
 
@@ -534,16 +421,86 @@ def apply_secret_overlays(local, secrets_dir, workdir):
     return applied
 
 
-def local_configs(config_dir):
+#   What each config file of a directory parsed to last time, kept across
+#   runs per directory: a file with the same file_key() is not parsed again.
+#   Only what the sync needs is kept (version, description, content digest,
+#   the paths declaring a secret), never the content: a config holds no
+#   secret, but the cache is not the place to find out.
+CONFIG_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".yuneta", "cache", "configs")
+
+
+def config_cache_path(config_dir):
+    digest = hashlib.blake2b(config_dir.encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(CONFIG_CACHE_DIR, "%s.json" % digest)
+
+
+def load_config_cache(config_dir):
+    """The parse cache of `config_dir` ({filename: entry}); {} if none."""
+    entries = load_json_cache(config_cache_path(config_dir))
+    if entries.get("dir") != config_dir:
+        return {}
+    files = entries.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def save_config_cache(config_dir, entries):
+    """Write the cache of `config_dir` back (atomically), only its present files."""
+    entries = dict(
+        (name, e) for name, e in entries.items()
+        if os.path.isfile(os.path.join(config_dir, name)))
+    save_json_cache(config_cache_path(config_dir), {"dir": config_dir, "files": entries})
+
+
+def parse_config(path):
     """
-    Return {id: {id, version, description, path, content}} for every config
-    ``*.json`` in config_dir. Files starting with '_' (batch/deploy helpers such
-    as ``_deploy_*.json`` / ``_update-configs.json``) are skipped, as are files
-    without a ``__version__`` field (not deployable under the agent contract).
+    Parse one config file into its cache entry: {version, description, digest,
+    sentinels}, or {skip, level} when it is not a deployable config. Returns
+    (entry, content); content is None when skipped.
+    """
+    name = os.path.basename(path)
+    try:
+        content = load_jsonc(path)
+    except (OSError, json.JSONDecodeError) as e:
+        return {"skip": "%s: cannot parse as JSON (%s), skipped" % (name, e),
+                "level": "error"}, None
+    if not isinstance(content, dict):
+        return {"skip": "%s: top-level JSON is not an object, skipped" % name,
+                "level": "error"}, None
+    version = content.get("__version__", "")
+    if version == "" or version is None:
+        return {"skip": "%s: no __version__ field, skipped (not a deployable config)" % name,
+                "level": "warning"}, None
+    return {
+        "version": str(version),
+        "description": content.get("__description__", ""),
+        "digest": content_digest(content),
+        "sentinels": find_sentinels(content),
+    }, content
+
+
+def config_content(lc):
+    """The parsed content of a local config; read now if it came from the cache."""
+    if lc["content"] is None:
+        lc["content"] = load_jsonc(lc["path"])
+    return lc["content"]
+
+
+def local_configs(config_dir, cache=None):
+    """
+    Return {id: {id, version, description, path, file, content, digest, sentinels}}
+    for every config ``*.json`` in config_dir. Files starting with '_'
+    (batch/deploy helpers such as ``_deploy_*.json`` /
+    ``_update-configs.json``) are skipped, as are files without a
+    ``__version__`` field (not deployable under the agent contract).
 
     The config id is the filename without the ``.json`` extension.
+
+    With `cache` (see load_config_cache()) a file whose file key is unchanged
+    is not parsed: its `content` is None until config_content() needs it. The
+    files parsed are added to it.
     """
     out = {}
+    parsed = cached = 0
     for name in sorted(os.listdir(config_dir)):
         if name.startswith("_") or not name.endswith(".json"):
             continue
@@ -551,46 +508,61 @@ def local_configs(config_dir):
         if not os.path.isfile(path):
             continue
         try:
-            content = load_jsonc(path)
-        except (OSError, json.JSONDecodeError) as e:
-            print(red("  ! %s: cannot parse as JSON (%s), skipped" % (name, e)))
-            continue
-        if not isinstance(content, dict):
-            print(red("  ! %s: top-level JSON is not an object, skipped" % name))
-            continue
-        version = content.get("__version__", "")
-        if version == "" or version is None:
-            print(yellow("  ! %s: no __version__ field, skipped (not a deployable config)" % name))
+            key = file_key(path)
+        except OSError:
+            key = None
+        entry = cache.get(name) if cache is not None else None
+        content = None
+        if entry and key is not None and entry.get("key") == key:
+            cached += 1
+        else:
+            entry, content = parse_config(path)
+            parsed += 1
+            if cache is not None and key is not None:
+                entry["key"] = key
+                cache[name] = entry
+        if "skip" in entry:
+            colour = red if entry.get("level") == "error" else yellow
+            print(colour("  ! %s" % entry["skip"]))
             continue
         cid = name[:-len(".json")]
         out[cid] = {
             "id": cid,
-            "version": str(version),
-            "description": content.get("__description__", ""),
+            "version": entry["version"],
+            "description": entry["description"],
             "path": os.path.abspath(path),
+            "file": os.path.abspath(path),     # the committed file, even after an overlay
             "content": content,
+            "digest": entry["digest"],
+            "sentinels": entry["sentinels"],
         }
+    if cache is not None:
+        print(dim("  configs: %d parsed, %d from the cache" % (parsed, cached)))
     return out
 
 
-def agent_configs(ycommand, url, jwt):
+def agent_configs(session):
     """
-    Return {id: {version, description, date, zcontent, yunos}} from the agent via
+    Return {id: {version, description, date, digest, yunos}} from the agent via
     'ycommand -c *list-configs' (the '*' forces raw JSON). One record per id
     (the current primary version).
+
+    Each record's ``zcontent`` is reduced to its content_digest() here and not
+    kept: the digest is all classify() needs, and agent_config_contents() reads
+    the contents of the configs that are to be shown. A ``digest`` the
+    agent reports itself (``blake2b:<hex>`` of the same canonical form) is
+    taken as is.
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-configs"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
+        data = session.query("*list-configs")
     except (OSError, subprocess.SubprocessError) as e:
         print(red("ERROR: cannot run ycommand: %s" % e))
         sys.exit(2)
-    try:
-        data = parse_leading_json(res.stdout)
-    except json.JSONDecodeError:
-        print(red("ERROR: '*list-configs' did not return JSON. Is the agent up?"))
-        print(dim(res.stdout[:500]))
-        print(dim(res.stderr[:500]))
+    except json.JSONDecodeError as e:
+        print(red("ERROR: '*list-configs' did not return JSON (ycommand exit %s). Is the agent up?"
+                  % getattr(e, "returncode", "?")))
+        print(dim(e.doc[:500]))
+        print(dim(getattr(e, "stderr", "")[:500]))
         sys.exit(2)
     if not isinstance(data, list):
         print(red("ERROR: unexpected '*list-configs' payload (not a list)."))
@@ -604,13 +576,87 @@ def agent_configs(ycommand, url, jwt):
             "version": str(rec.get("version", "?")),
             "description": rec.get("description", ""),
             "date": rec.get("date", "?"),
-            "zcontent": rec.get("zcontent", None),
+            "digest": agent_digest(rec),
             "yunos": rec.get("yunos", []),
         }
     return out
 
 
-def agent_config_instances(ycommand, url, jwt):
+def agent_digest(rec):
+    digest = rec.get("digest")
+    if isinstance(digest, str) and digest.startswith("blake2b:"):
+        return digest
+    return content_digest(rec.get("zcontent"))
+
+
+def agent_config_contents(session, cids):
+    """
+    {id: content} of the agent's primary records of the configs `cids`, from
+    one '*list-configs' read again for the purpose; only those are kept. An
+    id the listing does not carry (or all of them, when it cannot be read) is
+    left out.
+    """
+    cids = set(cids)
+    try:
+        data = session.query("*list-configs", fresh=True)
+    except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
+        return {}
+    finally:
+        session.invalidate()
+    out = {}
+    for rec in data if isinstance(data, list) else []:
+        if isinstance(rec, dict) and rec.get("id") in cids:
+            out[rec["id"]] = rec.get("zcontent")
+    return out
+
+
+def mask_paths(node, paths, path=""):
+    """
+    A copy of `node` with the leaves at `paths` (as find_sentinels() names
+    them) replaced by SECRET_SENTINEL, so a diff never shows a credential.
+    """
+    if isinstance(node, dict):
+        return dict(
+            (k, mask_paths(v, paths, "%s.%s" % (path, k) if path else k))
+            for k, v in node.items())
+    if isinstance(node, list):
+        return [mask_paths(v, paths, "%s[%d]" % (path, i)) for i, v in enumerate(node)]
+    return SECRET_SENTINEL if path in paths else node
+
+
+def print_config_diff(r, theirs):
+    """
+    Unified diff, agent -> local, of an UPDATE row: the committed file against
+    the agent's content `theirs` (None when it could not be read), both in
+    canonical form, with the fields the file declares secret masked on both
+    sides.
+    """
+    lc = r["local"]
+    if theirs is None:
+        print(dim("   (cannot read the agent's content of %s)" % r["id"]))
+        return
+    try:
+        mine = load_jsonc(lc["file"])
+    except (OSError, json.JSONDecodeError) as e:
+        print(dim("   (cannot read %s: %s)" % (lc["file"], e)))
+        return
+    secret = set(lc["sentinels"])
+
+    def lines(content):
+        return json.dumps(_canonical(mask_paths(content, secret)), sort_keys=True,
+                          indent=2, ensure_ascii=False).splitlines()
+
+    for line in difflib.unified_diff(
+            lines(theirs), lines(mine), "agent:%s" % r["id"], lc["file"], lineterm=""):
+        if line.startswith("+") and not line.startswith("+++"):
+            print(green(line))
+        elif line.startswith("-") and not line.startswith("---"):
+            print(red(line))
+        else:
+            print(dim(line))
+
+
+def agent_config_instances(session):
     """
     Return {id: set(version, ...)} for EVERY installed config record, via
     'ycommand -c *list-configs-instances' (the '*' forces raw JSON).
@@ -621,10 +667,8 @@ def agent_config_instances(ycommand, url, jwt):
     (id,version)). This set is the authoritative "is this version already
     installed?". Returns {} on any error so classify() degrades gracefully.
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-configs-instances"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-        data = parse_leading_json(res.stdout)
+        data = session.query("*list-configs-instances")
     except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
         return {}
     if not isinstance(data, list):
@@ -693,7 +737,7 @@ def classify(local, agent, instances):
             })
         else:
             # Same version. Only worth an update-config if content changed.
-            if lc["content"] == ac["zcontent"]:
+            if lc["digest"] == ac["digest"]:
                 rows.append({
                     "id": cid, "kind": "uptodate", "action": None,
                     "local": lc, "agent": ac,
@@ -748,15 +792,14 @@ def print_table(rows, show_uptodate):
 # ----------------------------------------------------------------------------
 #   Execution
 # ----------------------------------------------------------------------------
-def run_one(ycommand, url, jwt, action, cid, path, dry_run):
+def run_one(session, action, cid, path, dry_run):
     cmd_str = "%s id='%s' content64=$$(%s)" % (action, cid, path)
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", cmd_str]
     print(cyan(">> ycommand -c '%s'" % cmd_str))
     if dry_run:
         print(dim("   (dry-run, not executed)"))
         return True
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=120)
+        res = session.run(cmd_str, timeout=120)
     except (OSError, subprocess.SubprocessError) as e:
         print(red("   ERROR: %s" % e))
         return False
@@ -778,15 +821,14 @@ def run_one(ycommand, url, jwt, action, cid, path, dry_run):
     return ok
 
 
-def run_ycmd(ycommand, url, jwt, cmd_str, dry_run, timeout=120):
+def run_ycmd(session, cmd_str, dry_run, timeout=120):
     """Run one `ycommand -c '<cmd_str>'`, echoing it. Returns (ok, stdout)."""
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", cmd_str]
     print(cyan(">> ycommand -c '%s'" % cmd_str))
     if dry_run:
         print(dim("   (dry-run, not executed)"))
         return True, ""
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=timeout)
+        res = session.run(cmd_str, timeout=timeout)
     except (OSError, subprocess.SubprocessError) as e:
         print(red("   ERROR: %s" % e))
         return False, ""
@@ -806,15 +848,13 @@ def run_ycmd(ycommand, url, jwt, cmd_str, dry_run, timeout=120):
     return ok, out
 
 
-def yuno_states_by_id(ycommand, url, jwt):
+def yuno_states_by_id(session):
     """
     Return {yuno_id: record} for every yuno the agent manages, via '*list-yunos'.
     Each record carries yuno_running / yuno_playing. {} on any error.
     """
-    cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-yunos"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-        data = parse_leading_json(res.stdout)
+        data = session.query("*list-yunos")
     except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
         return {}
     if not isinstance(data, list):
@@ -826,54 +866,48 @@ def yuno_states_by_id(ycommand, url, jwt):
     return out
 
 
-def wait_until_stopped(ycommand, url, jwt, yid, timeout_s=15.0, poll_s=0.3):
+def wait_until_stopped(session, yid, timeout_s=15.0):
     """
-    Poll '*list-yunos id=<yid>' until the yuno is no longer running, so a later
-    run-yuno relaunches a fully-exited process. Returns True if it stopped.
+    Poll '*list-yunos id=<yid>' (with backoff, see AgentSession.poll()) until
+    the yuno is no longer running, so a later run-yuno relaunches a
+    fully-exited process. Returns True if it stopped.
     """
-    deadline = time.monotonic() + timeout_s
-    while time.monotonic() < deadline:
-        cmd = ycmd_base(ycommand, url, jwt) + ["-c", "*list-yunos id=%s" % yid]
-        try:
-            res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-            data = parse_leading_json(res.stdout)
-        except (OSError, subprocess.SubprocessError, json.JSONDecodeError):
-            data = []
+    def stopped(data):
         records = data if isinstance(data, list) else []
-        if not any(isinstance(r, dict) and r.get("yuno_running") for r in records):
-            return True
-        time.sleep(poll_s)
-    return False
+        return not any(isinstance(r, dict) and r.get("yuno_running") for r in records)
+
+    return session.poll("*list-yunos id=%s" % yid, stopped, timeout=timeout_s)
 
 
-def restart_yuno(ycommand, url, jwt, yid, was_running, was_playing, dry_run):
+def restart_yuno(session, yid, was_running, was_playing, dry_run, wait_ready=None):
     """
     Bounce one yuno by id so it re-reads its config, restoring prior run/play
     state. A yuno that was not running is left stopped — it reads the new config
     on its next start. kill-yuno is orderly (SIGQUIT), so the gbmem audit runs.
+
+    With `wait_ready` (seconds) it waits for the yuno to be running, and
+    playing if it was, again (wait_yunos_ready()). Returns True/False for
+    whether it came up when waited for, else None.
     """
     if not was_running:
         print(dim("   %s not running — left stopped (reads new config on next start)" % yid))
-        return
-    run_ycmd(ycommand, url, jwt, "kill-yuno id=%s" % yid, dry_run)
-    if not dry_run and not wait_until_stopped(ycommand, url, jwt, yid):
+        return None
+    run_ycmd(session, "kill-yuno id=%s" % yid, dry_run)
+    if not dry_run and not wait_until_stopped(session, yid):
         print(yellow("   ! %s still running after kill" % yid))
-    run_ycmd(ycommand, url, jwt, "run-yuno id=%s play=0" % yid, dry_run)
+    run_ycmd(session, "run-yuno id=%s play=0" % yid, dry_run)
     if was_playing:
-        run_ycmd(ycommand, url, jwt, "play-yuno id=%s" % yid, dry_run)
-
-
-def ask(prompt):
-    try:
-        return input(prompt).strip().lower()
-    except EOFError:
-        return "q"
+        run_ycmd(session, "play-yuno id=%s" % yid, dry_run)
+    if not wait_ready or dry_run:
+        return None
+    return report_ready(yid, *wait_yunos_ready(
+        session, "*list-yunos id=%s" % yid, {str(yid): was_playing}, wait_ready))
 
 
 # ----------------------------------------------------------------------------
 #   Main
 # ----------------------------------------------------------------------------
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser(
         description="Compare the configs in a directory with the agent and push updates.")
     ap.add_argument("config_dir", nargs="?", default=".",
@@ -893,34 +927,25 @@ def main():
                          "over each config before pushing. A committed config declares "
                          "a credential with the value \"__SECRET__\"; if the overlay "
                          "does not supply it, the push is REFUSED.")
+    ap.add_argument("--diff", action="store_true",
+                    help="show what changed in each UPDATE (the agent's content "
+                         "is read for those only; secret fields masked).")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="parse every config; do not read or write the cache "
+                         "of previous parses (%s)." % CONFIG_CACHE_DIR)
     ap.add_argument("-r", "--restart", action="store_true",
                     help="after pushing a changed config, also restart the using "
                          "yunos to apply it (default: push only + print a "
                          "reminder). Installing a config never needs a kill; the "
                          "restart is optional.")
-    auth = ap.add_argument_group(
-        "OAuth2 (remote wss:// agent; logs in ONCE, reuses the token via -j)")
-    auth.add_argument("-I", "--issuer", default=None,
-                      help="OIDC issuer for discovery, e.g. "
-                           "https://auth.artgins.com/realms/artgins")
-    auth.add_argument("-T", "--token-endpoint", default=None,
-                      help="explicit token endpoint (skips discovery).")
-    auth.add_argument("-Z", "--client-id", default=None, help="OAuth2 client_id.")
-    auth.add_argument("--client-secret", default=None,
-                      help="OAuth2 client_secret (confidential client only).")
-    auth.add_argument("-x", "--user-id", default=None, help="OAuth2 username.")
-    auth.add_argument("-X", "--user-passw", default=None, help="OAuth2 password.")
-    auth.add_argument("-j", "--jwt", default=None,
-                      help="reuse this jwt directly (skip the login).")
-
-    tls = ap.add_argument_group("TLS (wss:// agent)")
-    tls.add_argument("--ssl-trusted-certificate", default=None,
-                     help="PEM of the CA that signs the agent certificate.")
-    tls.add_argument("--ssl-server-name", default=None,
-                     help="name to check the agent certificate against "
-                          "(default: the host of the url).")
-    args = ap.parse_args()
-    set_tls_flags(args)
+    ap.add_argument("--wait-ready", type=float, nargs="?", const=60.0, default=None,
+                    metavar="SECONDS",
+                    help="with --restart, wait (up to SECONDS, default 60) for each "
+                         "restarted yuno to be running and playing again before "
+                         "the next; one that does not come up stops the restarts "
+                         "of later start_priorities.")
+    add_connection_args(ap)
+    args = ap.parse_args(argv)
 
     ycommand = args.ycommand or shutil.which("ycommand")
     if not ycommand:
@@ -932,20 +957,25 @@ def main():
         print(red("ERROR: config dir not found: %s" % config_dir))
         sys.exit(2)
 
-    jwt = obtain_jwt(args)
+    session = connect(ycommand, args)
 
     print(dim("config dir : %s" % config_dir))
     print(dim("ycommand   : %s%s%s" % (
         ycommand,
         ("  url=" + args.url) if args.url else "",
-        "  oauth2=on" if jwt else "")))
-
-    print(dim("\nreading agent configs (*list-configs)..."))
-    agent = agent_configs(ycommand, args.url, jwt)
-    print(dim("reading installed records (*list-configs-instances)..."))
-    instances = agent_config_instances(ycommand, args.url, jwt)
+        "  oauth2=on" if session.jwt else "")))
+
+    print(dim("\nreading the agent (*list-configs, *list-configs-instances)..."))
+    session.snapshot(["*list-configs", "*list-configs-instances"])
+    agent = agent_configs(session)
+    instances = agent_config_instances(session)
+    # Reduced to digests: the listing with every zcontent is not kept.
+    session.invalidate()
     print(dim("reading local configs (*.json in dir)..."))
-    local = local_configs(config_dir)
+    cache = None if args.no_cache else load_config_cache(config_dir)
+    local = local_configs(config_dir, cache)
+    if cache is not None:
+        save_config_cache(config_dir, cache)
 
     if not local:
         print(yellow("\nNo deployable *.json configs found in %s." % config_dir))
@@ -960,6 +990,7 @@ def main():
     #   would be easiest to forget.
     #
     secrets_workdir = None
+    prev_handlers = {}
     if args.secrets_dir:
         if not os.path.isdir(args.secrets_dir):
             print(red("Error: --secrets-dir '%s' is not a directory." % args.secrets_dir))
@@ -969,14 +1000,15 @@ def main():
         os.chmod(secrets_workdir, 0o700)
 
         # finally: does not run on a signal. Catch the ones we can so an
-        # interrupted sync still takes its plaintext with it.
+        # interrupted sync still takes its plaintext with it. The handlers
+        # found are put back afterwards: the CLI runs this in its own process.
         def _on_signal(signum, frame):
             shutil.rmtree(secrets_workdir, ignore_errors=True)
             raise SystemExit(128 + signum)
 
         for _sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
             try:
-                signal.signal(_sig, _on_signal)
+                prev_handlers[_sig] = signal.signal(_sig, _on_signal)
             except (OSError, ValueError):
                 pass
 
@@ -984,13 +1016,15 @@ def main():
         if secrets_workdir:
             applied = apply_secret_overlays(local, args.secrets_dir, secrets_workdir)
             print(dim("secret overlays applied: %d (from %s)" % (applied, args.secrets_dir)))
-        _sync_body(args, ycommand, jwt, local, agent, instances)
+        _sync_body(args, session, local, agent, instances)
     finally:
         if secrets_workdir:
             shutil.rmtree(secrets_workdir, ignore_errors=True)
+        for _sig, handler in prev_handlers.items():
+            signal.signal(_sig, handler if handler is not None else signal.SIG_DFL)
 
 
-def _sync_body(args, ycommand, jwt, local, agent, instances):
+def _sync_body(args, session, local, agent, instances):
     """
     The compare/confirm/push part, split out so the caller can guarantee the
     merged-secret workdir is destroyed however this returns.
@@ -998,6 +1032,13 @@ def _sync_body(args, ycommand, jwt, local, agent, instances):
 
     rows = classify(local, agent, instances)
     print_table(rows, show_uptodate=args.show_uptodate or args.dry_run)
+    if args.diff:
+        updates = [r for r in rows if r["kind"] == "update"]
+        contents = agent_config_contents(session, [r["id"] for r in updates]) if updates else {}
+        for r in updates:
+            print(bold("%s:" % r["id"]))
+            print_config_diff(r, contents.get(r["id"]))
+        print()
 
     installed = [r for r in rows if r["kind"] == "installed"]
     if installed:
@@ -1060,13 +1101,14 @@ def _sync_body(args, ycommand, jwt, local, agent, instances):
     ok, fail = 0, 0
     pushed = []
     for r in chosen:
-        if run_one(ycommand, args.url, jwt, r["action"], r["id"], r["local"]["path"], args.dry_run):
+        if run_one(session, r["action"], r["id"], r["local"]["path"], args.dry_run):
             ok += 1
             pushed.append(r)
         else:
             fail += 1
     print()
     print(bold("Done: %s, %s." % (green("%d ok" % ok), red("%d failed" % fail) if fail else dim("0 failed"))))
+    print(dim(session.describe_cost()))
 
     # A yuno reads its config only at (re)start. Restart the yunos that use a
     # successfully pushed config so the change takes effect — scoped by yuno id,
@@ -1083,7 +1125,7 @@ def _sync_body(args, ycommand, jwt, local, agent, instances):
 
     if affected and args.restart:
         print(dim("\nRestarting affected yuno(s) to apply the new config(s)..."))
-        states = yuno_states_by_id(ycommand, args.url, jwt)
+        states = yuno_states_by_id(session)
 
         # Restart in ascending start_priority order (the agent owns this number)
         # so infrastructure comes back before its dependents. Default 5 for
@@ -1094,13 +1136,26 @@ def _sync_body(args, ycommand, jwt, local, agent, instances):
             except (TypeError, ValueError):
                 return 5
 
+        # With --wait-ready a yuno that does not come back up holds back the
+        # later start_priorities: they may depend on it.
+        halted_at = None
+        held = []
         for yid in sorted(affected, key=lambda y: (_start_priority(y), y)):
+            if halted_at is not None and _start_priority(yid) > halted_at:
+                held.append(yid)
+                continue
             st = states.get(yid, {})
-            restart_yuno(
-                ycommand, args.url, jwt, yid,
+            ready = restart_yuno(
+                session, yid,
                 bool(st.get("yuno_running")), bool(st.get("yuno_playing")),
-                args.dry_run,
+                args.dry_run, args.wait_ready,
             )
+            if ready is False and halted_at is None:
+                halted_at = _start_priority(yid)
+        if held:
+            print(red("Not restarted, a lower start_priority did not come back up: %s" %
+                      ", ".join(held)))
+            print(dim("   their new config is pushed; it applies on their next start."))
     elif affected:
         print(dim("\nNote: a yuno reads its config when it (re)starts. For the change to take"))
         print(dim("effect, restart the yunos that use it: kill-yuno then run-yuno."))
@@ -3,8 +3,11 @@ from rich import print
 from rich.console import Console
 from .__version__ import __version__
 from .my_venv import app_venv
+from .agent_tools.agent_client import AgentSession, parse_leading_json
 from typing import Optional, List
 from pathlib import Path
+import hashlib
+import importlib
 import json
 import os
 import re
@@ -12,9 +15,12 @@ import socket
 import sys
 import subprocess
 import shutil
+import signal
 import textwrap
 import time
+import traceback
 import atexit
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 
 # # Check if YUNETAS_BASE is set, or derive it from the current directory if YUNETA_VERSION exists
@@ -122,22 +128,31 @@ if os.path.isfile(_LEGACY_REGISTRY_PATH) and not os.path.isfile(PROJECTS_REGISTR
         print(f"[yellow]Warning: could not migrate project registry "
               f"from {_LEGACY_REGISTRY_PATH}: {e}[/yellow]")
 
-# Directories to process
-DIRECTORIES = [
-    "kernel/c/gobj-c",
-    "kernel/c/ytls",
-    "kernel/c/libjwt",
-    "kernel/c/yev_loop",
-    "kernel/c/timeranger2",
-    "kernel/c/root-linux",
-    "kernel/c/root-esp32",
-    "modules/c/*",
-    "utils/c/*",
-    "yunos/c/*",
-    "stress/c/*",
-    "performance/c/*",
+# Directories to process, layer by layer: each layer links against the ones
+# before it, the directories inside a layer are independent of each other.
+BUILD_LAYERS = [
+    ["kernel/c/gobj-c"],
+    ["kernel/c/ytls", "kernel/c/libjwt"],
+    ["kernel/c/yev_loop"],
+    ["kernel/c/timeranger2"],
+    ["kernel/c/root-linux", "kernel/c/root-esp32"],
+    ["modules/c/*"],
+    ["utils/c/*", "yunos/c/*", "stress/c/*", "performance/c/*"],
 ]
 
+# The leading layers that install libraries; what follows is executables.
+# Registered projects link against these and nothing else.
+SDK_LIBRARY_LAYERS = 6
+
+DIRECTORIES = [directory for layer in BUILD_LAYERS for directory in layer]
+
+# cmake generators `init --generator` accepts: name -> (cmake -G value, the
+# build tool it writes for, the file that tool reads in build/).
+GENERATORS = {
+    "make": ("Unix Makefiles", "make", "Makefile"),
+    "ninja": ("Ninja", "ninja", "build.ninja"),
+}
+
 # Create the app.
 app = typer.Typer(help="TUI for yunetas SDK")
 app.add_typer(app_venv, name="venv")
@@ -153,26 +168,67 @@ def init(
     sdk_only: bool = typer.Option(
         False, "--sdk-only", help="Initialize only the yunetas SDK, skip registered projects."
     ),
+    jobs: int = typer.Option(
+        1, "--jobs", "-j",
+        help="Run cmake in up to N directories at the same time (0 = one per CPU)."
+    ),
+    generator: Optional[str] = typer.Option(
+        None, "--generator", "-G",
+        help="Build system cmake generates: 'make' (Makefiles) or 'ninja'. Default: "
+             "cmake's own (CMAKE_GENERATOR, else Makefiles). "
+             "build and clean then drive each build/ with the tool it was generated for."
+    ),
+    ccache: bool = typer.Option(
+        False, "--ccache",
+        help="Compile through a compiler cache (ccache, else sccache) when one is "
+             "installed; build then reports its hit rate."
+    ),
+    force: bool = typer.Option(
+        False, "--force",
+        help="Wipe outputs/ and every build/ and configure from scratch, even "
+             "where the configuration is unchanged."
+    ),
+    profile: bool = typer.Option(
+        False, "--profile",
+        help="Time every cmake/make run (wall, CPU, peak RSS); print them with the "
+             "critical path and write a Chrome trace JSON to the current directory."
+    ),
 ):
     """
     Initialize yunetas, create build directories and get compiler and build type from .config (menuconfig).
     Registered projects (see register-project) are initialized after the SDK.
+    A build directory configured from the same inputs is kept; --force wipes all.
     """
+    if profile:
+        start_profile("init")
+    if generator:
+        check_generator(generator)
     include_sdk, selected_projects = resolve_selection(projects, sdk_only)
 
+    launcher = None
+    if ccache:
+        launcher = find_compiler_launcher()
+        if launcher:
+            final_messages.append(f"[yellow]Compiler cache[/yellow]: [blue]{launcher}[/blue]")
+        else:
+            print("[yellow]Warning: --ccache given but neither ccache nor sccache is in PATH; "
+                  "compiling without a cache.[/yellow]")
+
     failed = []
 
     if include_sdk:
-        setup_yuneta_environment(True)
-        failed += process_directories(DIRECTORIES)
-        failed += process_directories(["."])
+        setup_yuneta_environment(force)
+        failed += process_directories(DIRECTORIES + ["."], jobs=jobs, generator=generator,
+                                      launcher=launcher, force=force)
     else:
         # Ensure outputs/include headers are up to date without wiping outputs
         setup_yuneta_environment(False)
 
     for project in selected_projects:
         print(f"[cyan]Project: {project['name']} ({project['path']})[/cyan]")
-        project_failed = process_directories([project_yunos_dir(project)])
+        project_failed = process_directories([project_yunos_dir(project)], jobs=jobs,
+                                             generator=generator, launcher=launcher,
+                                             force=force)
         failed += project_failed
         if not project_failed:
             final_messages.append(f"Project [cyan]{project['name']}[/cyan] initialized.")
@@ -267,10 +323,35 @@ def build(
     sdk_only: bool = typer.Option(
         False, "--sdk-only", help="Build only the yunetas SDK, skip registered projects."
     ),
+    jobs: int = typer.Option(
+        1, "--jobs", "-j",
+        help="CPU budget for a parallel build (0 = one per CPU). Independent directories "
+             "build side by side in dependency order, each make getting a share of it."
+    ),
+    full: bool = typer.Option(
+        False, "--full",
+        help="Run make install in every directory, even those whose inputs have not "
+             "changed since their last successful build."
+    ),
+    generator: Optional[str] = typer.Option(
+        None, "--generator", "-G",
+        help="Require every build/ to be generated for this tool ('make' or 'ninja'). "
+             "Default: use whichever each one was generated for."
+    ),
+    profile: bool = typer.Option(
+        False, "--profile",
+        help="Time every cmake/make run (wall, CPU, peak RSS); print them with the "
+             "critical path and write a Chrome trace JSON to the current directory."
+    ),
 ):
     """
     Build and install yunetas, then the registered projects (see register-project).
     """
+    if profile:
+        start_profile("build")
+    if generator:
+        check_generator(generator)
+    required_generator = generator
     include_sdk, selected_projects = resolve_selection(projects, sdk_only)
 
     # Refuse to build against a stale outputs_ext/ (linux-ext-libs bumped but
@@ -279,18 +360,51 @@ def build(
 
     setup_yuneta_environment(False)
 
-    if include_sdk:
-        process_build_command(DIRECTORIES, ["make", "install"])
-
     for project in selected_projects:
         yunos_dir = project_yunos_dir(project)
         if not os.path.isdir(os.path.join(yunos_dir, "build")):
             print(f"[red]Error: '{yunos_dir}/build' not found. Run 'yunetas init {project['name']}' first.[/red]")
             raise typer.Exit(code=1)
+
+    cached_dirs = []
+    if include_sdk:
+        cached_dirs += expand_directories(DIRECTORIES)
+    cached_dirs += [project_yunos_dir(project) for project in selected_projects]
+    cache_stats = snapshot_compiler_caches(cached_dirs)
+
+    if jobs != 1:
+        failed = run_build_graph(
+            build_graph(include_sdk, selected_projects, required_generator), ["make", "install"], jobs,
+            incremental=not full,
+        )
+        report_compiler_caches(cache_stats)
+        if failed:
+            final_messages.append("[red]build[/red] FAILED in:")
+            for node in failed:
+                final_messages.append(f"  [red]-[/red] {node['name']}")
+            print("\n".join(final_messages))
+            raise typer.Exit(code=1)
+        record_build_manifests()
+        for project in selected_projects:
+            final_messages.append(f"Project [cyan]{project['name']}[/cyan] built.")
+        final_messages.append(f"\n[yellow]build[/yellow] done.\n")
+        print("\n".join(final_messages))
+        return
+
+    if include_sdk:
+        process_build_command(DIRECTORIES, ["make", "install"], incremental=not full,
+                              generator=required_generator)
+
+    for project in selected_projects:
+        yunos_dir = project_yunos_dir(project)
         print(f"[cyan]Project: {project['name']} ({project['path']})[/cyan]")
-        process_build_command([yunos_dir], ["make", "install"])
+        process_build_command([yunos_dir], ["make", "install"], incremental=not full,
+                              generator=required_generator)
         final_messages.append(f"Project [cyan]{project['name']}[/cyan] built.")
 
+    record_build_manifests()
+    report_compiler_caches(cache_stats)
+
     final_messages.append(f"\n[yellow]build[/yellow] done.\n")
     print("\n".join(final_messages))
 
@@ -303,18 +417,32 @@ def clean(
     sdk_only: bool = typer.Option(
         False, "--sdk-only", help="Clean only the yunetas SDK, skip registered projects."
     ),
+    generator: Optional[str] = typer.Option(
+        None, "--generator", "-G",
+        help="Require every build/ to be generated for this tool ('make' or 'ninja'). "
+             "Default: use whichever each one was generated for."
+    ),
+    profile: bool = typer.Option(
+        False, "--profile",
+        help="Time every cmake/make run (wall, CPU, peak RSS); print them with the "
+             "critical path and write a Chrome trace JSON to the current directory."
+    ),
 ):
     """
     Clean up build directories in yunetas and in the registered projects.
     """
+    if profile:
+        start_profile("clean")
+    if generator:
+        check_generator(generator)
     include_sdk, selected_projects = resolve_selection(projects, sdk_only)
 
     if include_sdk:
-        process_build_command(DIRECTORIES, ["make", "clean"])
+        process_build_command(DIRECTORIES, ["make", "clean"], generator=generator)
 
     for project in selected_projects:
         print(f"[cyan]Project: {project['name']} ({project['path']})[/cyan]")
-        process_build_command([project_yunos_dir(project)], ["make", "clean"])
+        process_build_command([project_yunos_dir(project)], ["make", "clean"], generator=generator)
 
     final_messages.append(f"\n[yellow]clean[/yellow] done.\n")
     print("\n".join(final_messages))
@@ -829,7 +957,7 @@ def upgrade_yunos(
         raise typer.Exit(code=1)
     if not dry_run:
         try:
-            preview = _parse_leading_json(out)
+            preview = parse_leading_json(out)
         except (ValueError, json.JSONDecodeError):
             preview = []
         if not isinstance(preview, list) or not preview:
@@ -878,17 +1006,119 @@ def upgrade_yunos(
 
 
 @app.command()
-def test():
+def test(
+    jobs: int = typer.Option(
+        1, "--jobs", "-j",
+        help="Run up to N tests at the same time (ctest -j; 0 = one per CPU)."
+    ),
+    shard: Optional[str] = typer.Option(
+        None, "--shard",
+        help="Run only shard I of N ('I/N', 1-based): tests I, I+N, I+2N... "
+             "so N machines together run the whole suite."
+    ),
+    full: bool = typer.Option(
+        False, "--full",
+        help="Rebuild as before: make install everywhere, then make clean and "
+             "make install of the test tree, even when the install is current."
+    ),
+    profile: bool = typer.Option(
+        False, "--profile",
+        help="Time every cmake/make run (wall, CPU, peak RSS); print them with the "
+             "critical path and write a Chrome trace JSON to the current directory."
+    ),
+):
     """
     Run ctest in yunetas
     """
-    process_build_command(DIRECTORIES, ["make", "install"])
-    process_build_command(["."], ["make", "install"])
-    process_build_command(["."], ["make", "clean"])
-    ret = process_build_command(["."], ["make", "install"])
-    if ret == 0:
-        filename = datetime.now().isoformat().replace(":", "-") + ".txt"
-        process_build_command(["."], ["ctest", "--output-log", filename])
+    if profile:
+        start_profile("test")
+    ctest_range = parse_shard(shard) if shard else None
+
+    process_build_command(DIRECTORIES, ["make", "install"], incremental=not full)
+    if full:
+        process_build_command(["."], ["make", "install"])
+        process_build_command(["."], ["make", "clean"])
+    process_build_command(["."], ["make", "install"], incremental=not full)
+    record_build_manifests()
+
+    build_dir = Path(YUNETAS_BASE) / "build"
+    if not build_dir.is_dir():
+        print(f"[yellow]Skipping {YUNETAS_BASE}: No build directory found[/yellow]")
+        return
+    filename = datetime.now().isoformat().replace(":", "-") + ".txt"
+    command = ["ctest", "--output-log", filename]
+    jobs = resolve_jobs(jobs)
+    if jobs > 1:
+        command += ["-j", str(jobs)]
+    if ctest_range:
+        command += ["-I", ctest_range]
+
+    print(f"[blue]Running '{' '.join(command)}' in {build_dir}[/blue]")
+    rc, _ = run_command(command, build_dir)
+
+    summarize_ctest_log(build_dir / filename)
+    if rc != 0:
+        final_messages.append(f"[red]test[/red] FAILED (ctest exit code {rc}).\n")
+        print("\n".join(final_messages))
+        raise typer.Exit(code=1)
+    final_messages.append(f"[yellow]test[/yellow] done.\n")
+    print("\n".join(final_messages))
+
+
+def parse_shard(shard):
+    """
+    Turn '--shard I/N' into ctest's '-I I,,N' (start I, to the end, stride N).
+    ctest numbers the tests the same way on every machine, so the N shards are
+    disjoint and together cover the suite.
+    """
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", shard)
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        print(f"[red]Error: --shard must be I/N with 1 <= I <= N, got '{shard}'.[/red]")
+        raise typer.Exit(code=1)
+    return f"{int(m.group(1))},,{int(m.group(2))}"
+
+
+_CTEST_RESULT_RE = re.compile(
+    r"^\s*\d+/\d+\s+Test\s+#(\d+):\s+(\S+)\s+\.*\s*(.*?)\s+([\d.]+)\s+sec\s*$"
+)
+
+CTEST_SLOWEST = 10
+
+
+def summarize_ctest_log(log_path):
+    """
+    Append the per-test durations of a ctest --output-log to the recap:
+    the slowest tests, and every test that did not pass.
+    """
+    results = []
+    try:
+        with open(log_path, errors="replace") as f:
+            for line in f:
+                m = _CTEST_RESULT_RE.match(line)
+                if m:
+                    status = m.group(3).strip("* ") or "?"
+                    results.append((float(m.group(4)), m.group(2), status))
+    except OSError:
+        final_messages.append(f"[red]No ctest log at {log_path}[/red]")
+        return
+    if not results:
+        final_messages.append(f"[yellow]ctest[/yellow]: no test results in {log_path}")
+        return
+
+    results.sort(reverse=True)
+    not_passed = [r for r in results if r[2] != "Passed"]
+    total = sum(r[0] for r in results)
+    final_messages.append(
+        f"\n[yellow]ctest[/yellow]: {len(results)} tests, {len(not_passed)} not passed, "
+        f"{total:.2f}s of test time. Log: [blue]{log_path}[/blue]"
+    )
+    final_messages.append("  Slowest:")
+    for duration, name, status in results[:CTEST_SLOWEST]:
+        final_messages.append(f"    {duration:>8.2f}s  {name:<40} {status}")
+    if not_passed:
+        final_messages.append("  [red]Not passed[/red]:")
+        for duration, name, status in sorted(not_passed, key=lambda r: r[1]):
+            final_messages.append(f"    {duration:>8.2f}s  {name:<40} [red]{status}[/red]")
 
 
 def version_callback(value: bool):
@@ -1382,6 +1612,11 @@ def resolve_selection(project_names, sdk_only):
     return True, registered
 
 
+# Exit codes of a tool that stopped on a signal it caught (128 + signum).
+_SIGNAL_EXIT_CODES = frozenset(
+    128 + signum for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP))
+
+
 def run_agent_tool(script_name, args, cwd=None):
     """
     Run one of the bundled agent tools, forwarding arguments.
@@ -1392,23 +1627,58 @@ def run_agent_tool(script_name, args, cwd=None):
     ``pipx install --upgrade yunetas`` could hand a new flag to a script from
     an older SDK and die with "unrecognized arguments".
 
-    Still a subprocess, not an import: the tools own their exit codes and
-    install their own signal handlers (sync_configs wipes its plaintext
-    workdir on SIGINT/SIGTERM), and running them in-process would put both
-    under typer's control.
+    Run in this process, through the tool's ``main(argv)``: 'sync' drives two
+    of them (and one sync_configs per host), and a subprocess each started a
+    new interpreter and logged in to OAuth2 again. In-process the token from
+    the first login is reused (agent_client keeps it in memory). What a
+    subprocess kept apart is put back after the call: the exit code comes from
+    the tool's SystemExit, sys.argv, sys.stdout and the working directory are
+    restored, and sync_configs restores the signal handlers it installs. A
+    tool that dies of any other exception prints its traceback and returns 1,
+    as its process did, so 'sync' goes on with the next host.
+
+    An interrupt is not an exit code: a Ctrl-C reached the CLI along with the
+    tool's process and stopped the whole command. So KeyboardInterrupt, and a
+    tool's own exit on a signal (128 + SIGINT/SIGTERM/SIGHUP, as sync_configs
+    raises after removing its secrets workdir), go on up; 'sync' stops there
+    instead of moving on to the next host.
+
+    Module state shared from one call to the next: agent_client's token and
+    token-endpoint caches, on purpose. The tools write no module globals;
+    everything else of a run lives in its main().
 
     Returns:
         int: the tool's exit code.
     """
-    module = "yunetas.agent_tools.%s" % script_name[:-len(".py")] \
-        if script_name.endswith(".py") else "yunetas.agent_tools.%s" % script_name
+    name = script_name[:-len(".py")] if script_name.endswith(".py") else script_name
+    tool = importlib.import_module(".agent_tools.%s" % name, __package__)
 
-    env = os.environ.copy()
-    env.setdefault("YUNETAS_BASE", YUNETAS_BASE)
-    result = subprocess.run(
-        [sys.executable, "-m", module] + list(args), cwd=cwd, env=env
-    )
-    return result.returncode
+    if YUNETAS_BASE:
+        os.environ.setdefault("YUNETAS_BASE", YUNETAS_BASE)
+    saved_argv, saved_stdout = sys.argv, sys.stdout
+    saved_cwd = os.getcwd() if cwd else None
+    sys.argv = [script_name] + list(args)
+    try:
+        if cwd:
+            os.chdir(cwd)
+        tool.main(list(args))
+        return 0
+    except SystemExit as e:
+        if e.code in _SIGNAL_EXIT_CODES:
+            raise
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        sys.stdout.flush()
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.argv, sys.stdout = saved_argv, saved_stdout
+        if saved_cwd:
+            os.chdir(saved_cwd)
 
 
 def push_configs(selected_projects, host, url, forwarded):
@@ -1477,21 +1747,12 @@ def push_configs(selected_projects, host, url, forwarded):
 #--------------------------------------------------#
 #   ycommand helpers (talk to the local agent)
 #--------------------------------------------------#
-# ycommand wraps a JSON payload with a leading blank line and a coloured footer.
+# ycommand colours its table output; snap_exists() reads the plain text.
 _ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
 
-
-def _parse_leading_json(text):
-    """
-    Decode the first JSON value found in ycommand's stdout (ANSI stripped),
-    ignoring whatever trails it. Raises ValueError if none is present.
-    """
-    clean = _ANSI_RE.sub("", text or "")
-    start = next((i for i, ch in enumerate(clean) if ch in "[{"), None)
-    if start is None:
-        raise ValueError("no JSON value found")
-    obj, _ = json.JSONDecoder().raw_decode(clean[start:])
-    return obj
+# One AgentSession per agent (ycommand + connection flags) for the run, so the
+# listings read by one step are not asked for again by the next.
+_agent_sessions = {}
 
 
 def ycommand_path():
@@ -1499,6 +1760,16 @@ def ycommand_path():
     return shutil.which("ycommand")
 
 
+def agent_session(ycommand, url):
+    """The session to the agent at `url` (or to the node in play)."""
+    flags = ycmd_conn_flags(url)
+    key = (ycommand, tuple(flags))
+    session = _agent_sessions.get(key)
+    if session is None:
+        session = _agent_sessions[key] = AgentSession(ycommand, flags=flags)
+    return session
+
+
 def run_ycommand(ycommand, url, cmd_str, dry_run=False, timeout=300, echo_output=True):
     """
     Run one `ycommand -c '<cmd_str>'`, echoing it. Returns (ok, stdout).
@@ -1508,14 +1779,12 @@ def run_ycommand(ycommand, url, cmd_str, dry_run=False, timeout=300, echo_output
     printed — used when the caller renders its own concise summary instead
     of dumping ycommand's verbose table (e.g. find-new-yunos).
     """
-    cmd = [ycommand] + ycmd_conn_flags(url)
-    cmd += ["-c", cmd_str]
     print(f"[cyan]>> ycommand -c '{cmd_str}'[/cyan]")
     if dry_run:
         print("   [dim](dry-run, not executed)[/dim]")
         return True, ""
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=timeout)
+        res = agent_session(ycommand, url).run(cmd_str, timeout=timeout)
     except (OSError, subprocess.SubprocessError) as e:
         print(f"[red]   ERROR: {e}[/red]")
         return False, ""
@@ -1539,15 +1808,9 @@ def local_realm_ids(url=None):
     ycommand = ycommand_path()
     if not ycommand:
         return None
-    cmd = [ycommand] + ycmd_conn_flags(url)
-    cmd += ["-c", "*list-realms"]
-    try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-    except (OSError, subprocess.SubprocessError):
-        return None
     try:
-        data = _parse_leading_json(res.stdout)
-    except (ValueError, json.JSONDecodeError):
+        data = agent_session(ycommand, url).query("*list-realms")
+    except (OSError, subprocess.SubprocessError, ValueError):
         return None
     if not isinstance(data, list):
         return None
@@ -1564,10 +1827,8 @@ def snap_exists(ycommand, url, name):
     snap list can't be read. The 'snaps' command renders a table whose Name
     column holds the name quoted, so an exact quoted match is unambiguous.
     """
-    cmd = [ycommand] + ycmd_conn_flags(url)
-    cmd += ["-c", "snaps"]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
+        res = agent_session(ycommand, url).call("snaps")
     except (OSError, subprocess.SubprocessError):
         return None
     if res.returncode != 0:
@@ -1584,17 +1845,9 @@ def active_snap_name(ycommand, url):
     ycommand emit raw JSON); the agent keeps at most one snap active (treedb
     activates a single tag), so the first record flagged active wins.
     """
-    cmd = [ycommand] + ycmd_conn_flags(url)
-    cmd += ["-c", "*snaps"]
-    try:
-        res = subprocess.run(cmd, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
-    except (OSError, subprocess.SubprocessError):
-        return None
-    if res.returncode != 0:
-        return None
     try:
-        data = _parse_leading_json(res.stdout)
-    except (ValueError, json.JSONDecodeError):
+        data = agent_session(ycommand, url).query("*snaps", check=True)
+    except (OSError, subprocess.SubprocessError, ValueError):
         return None
     if not isinstance(data, list):
         return None
@@ -1604,6 +1857,88 @@ def active_snap_name(ycommand, url):
     return None
 
 
+#--------------------------------------------------#
+#   Kconfig model
+#
+#   .config (and YUNETA_VERSION, same syntax) is parsed once per process and
+#   kept while the file is the same one: the cache is keyed by device, inode,
+#   size and mtime, so an editor that replaces the file, or menuconfig saving
+#   it again, is seen on the next read. Every helper reads from here.
+#--------------------------------------------------#
+_kconfig_cache = {}
+
+_KCONFIG_NOT_SET_RE = re.compile(r"^#\s*(\w+) is not set\s*$")
+
+
+def load_kconfig(config_file_path):
+    """
+    Parse a Kconfig-style file, or return the parse cached for it.
+
+    Returns:
+        dict: {
+            "symbols": {name: value} in file order, value being True (y),
+                       False (n, or "# NAME is not set"), int (digits) or str
+                       (anything else, quotes removed),
+            "entries": [(name, raw value)] of the assignment lines, in order,
+            "digest":  sha256 of the file's bytes,
+        }
+
+    Raises:
+        OSError: the file cannot be read.
+    """
+    st = os.stat(config_file_path)
+    stamp = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _kconfig_cache.get(config_file_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(config_file_path, "rb") as f:
+        data = f.read()
+
+    symbols = {}
+    entries = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        line = line.strip()  # Remove leading and trailing whitespace
+        if not line:
+            continue
+        if line.startswith("#"):
+            m = _KCONFIG_NOT_SET_RE.match(line)
+            if m:
+                symbols[m.group(1)] = False
+            continue  # Skip comments
+
+        # Split configuration line into key and value
+        if "=" in line:
+            key, value = line.split("=", 1)
+            key = key.strip()
+            value = value.strip()
+            entries.append((key, value))
+            if value == "y":
+                symbols[key] = True
+            elif value == "n":
+                symbols[key] = False
+            elif value.isdigit():
+                symbols[key] = int(value)
+            else:
+                symbols[key] = value.strip('"')
+
+    model = {
+        "symbols": symbols,
+        "entries": entries,
+        "digest": hashlib.sha256(data).hexdigest(),
+    }
+    _kconfig_cache[config_file_path] = (stamp, model)
+    return model
+
+
+def sdk_kconfig():
+    """The symbols of $YUNETAS_BASE/.config, or None when there is no .config."""
+    try:
+        return load_kconfig(os.path.join(YUNETAS_BASE, ".config"))["symbols"]
+    except OSError:
+        return None
+
+
 def kconfig2include(config_file_path):
     """
     Convert a Kconfig-style configuration file into a C-style header content.
@@ -1617,32 +1952,55 @@ def kconfig2include(config_file_path):
     header_content = ""
 
     try:
-        with open(config_file_path, "r") as config_file:
-            for line in config_file:
-                line = line.strip()  # Remove leading and trailing whitespace
-                if not line or line.startswith("#"):
-                    continue  # Skip comments and empty lines
-
-                # Split configuration line into key and value
-                if "=" in line:
-                    key, value = line.split("=", 1)
-                    key = key.strip()
-                    value = value.strip()
-
-                    # Process value
-                    if value == "y":
-                        header_content += f"#define {key} 1\n"
-                    elif value.isdigit():
-                        header_content += f"#define {key} {value}\n"
-                    else:
-                        value = value.strip('"')  # Remove quotes if present
-                        header_content += f"#define {key} \"{value}\"\n"
+        for key, value in load_kconfig(config_file_path)["entries"]:
+            # Process value
+            if value == "y":
+                header_content += f"#define {key} 1\n"
+            elif value.isdigit():
+                header_content += f"#define {key} {value}\n"
+            else:
+                value = value.strip('"')  # Remove quotes if present
+                header_content += f"#define {key} \"{value}\"\n"
 
     except Exception as e:
         raise RuntimeError(f"Error processing configuration file {config_file_path}: {e}")
 
     return header_content
 
+
+def write_if_changed(path, content):
+    """
+    Write `content` to `path` only if the file does not already hold exactly
+    those bytes, through a temporary file renamed over it.
+
+    A generated header rewritten with the same bytes still gets a new mtime,
+    and every object that includes it is recompiled. The rename means a
+    compiler never reads a half-written header either.
+
+    Returns:
+        bool: True if the file was (re)written.
+    """
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
 def is_file_outdated(source_file, target_file):
     """
     Check if the source file is newer than the target file.
@@ -1749,11 +2107,10 @@ def setup_yuneta_environment(reset_outputs=False):
         try:
             version_header_content += kconfig2include(yuneta_version_path2)
 
-            # Write the yuneta_version.h file
-            with open(yuneta_version_h_path, "w") as header_file:
-                header_file.write(version_header_content)
-            msg = f"Generated 'yuneta_version.h' at {yuneta_version_h_path}"
-            final_messages.append(msg)
+            # Write the yuneta_version.h file (only if its bytes change)
+            if write_if_changed(yuneta_version_h_path, version_header_content):
+                msg = f"Generated 'yuneta_version.h' at {yuneta_version_h_path}"
+                final_messages.append(msg)
 
         except Exception as e:
             print(f"Error: Unable to generate yuneta_version.h. {e}")
@@ -1781,11 +2138,10 @@ def setup_yuneta_environment(reset_outputs=False):
         try:
             config_header_content += kconfig2include(yuneta_config_path)
 
-            # Write the yuneta_config.h file
-            with open(yuneta_config_h_path, "w") as header_file:
-                header_file.write(config_header_content)
-            msg = f"Generated 'yuneta_config.h' at {yuneta_config_h_path}"
-            final_messages.append(msg)
+            # Write the yuneta_config.h file (only if its bytes change)
+            if write_if_changed(yuneta_config_h_path, config_header_content):
+                msg = f"Generated 'yuneta_config.h' at {yuneta_config_h_path}"
+                final_messages.append(msg)
         except Exception as e:
             print(f"Error: Unable to generate yuneta_config.h. {e}")
             sys.exit(1)
@@ -1816,17 +2172,17 @@ def get_compiler_from_config():
     """
     Parse .config and return CC (C compiler) based on CONFIG_USE_COMPILER_*
     """
-    config_path = os.path.join(YUNETAS_BASE, ".config")
-    if not os.path.isfile(config_path):
+    symbols = sdk_kconfig()
+    if symbols is None:
         return None
 
-    with open(config_path, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line == "CONFIG_USE_COMPILER_CLANG=y":
-                return "clang"
-            elif line == "CONFIG_USE_COMPILER_GCC=y":
-                return "gcc"
+    for key, value in symbols.items():
+        if value is not True:
+            continue
+        if key == "CONFIG_USE_COMPILER_CLANG":
+            return "clang"
+        elif key == "CONFIG_USE_COMPILER_GCC":
+            return "gcc"
 
     return None
 
@@ -1838,21 +2194,19 @@ def get_build_type_from_config():
     """
     Parse .config and return build type based on CONFIG_BUILD_TYPE_*
     """
-    config_path = os.path.join(YUNETAS_BASE, ".config")
-    if not os.path.isfile(config_path):
+    symbols = sdk_kconfig()
+    if symbols is None:
         return None
 
-    with open(config_path, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line == "CONFIG_BUILD_TYPE_RELEASE=y":
-                return "Release"
-            elif line == "CONFIG_BUILD_TYPE_DEBUG=y":
-                return "Debug"
-            elif line == "CONFIG_BUILD_TYPE_RELWITHDEBINFO=y":
-                return "RelWithDebInfo"
-            elif line == "CONFIG_BUILD_TYPE_MINSIZEREL=y":
-                return "MinSizeRel"
+    build_types = {
+        "CONFIG_BUILD_TYPE_RELEASE": "Release",
+        "CONFIG_BUILD_TYPE_DEBUG": "Debug",
+        "CONFIG_BUILD_TYPE_RELWITHDEBINFO": "RelWithDebInfo",
+        "CONFIG_BUILD_TYPE_MINSIZEREL": "MinSizeRel",
+    }
+    for key, value in symbols.items():
+        if value is True and key in build_types:
+            return build_types[key]
 
     return None
 
@@ -1860,12 +2214,193 @@ def get_build_type_from_config():
 #--------------------------------------------------#
 #   Process directories and run cmake
 #--------------------------------------------------#
-def process_directories(directories: List[str]):
+def resolve_jobs(jobs):
+    """
+    Normalize a --jobs value: 0 (or less) means one per CPU.
+    """
+    if jobs is None or jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def expand_directories(directories: List[str]):
+    """
+    Expand the DIRECTORIES-style entries into the existing directories they
+    name, in order. SDK entries are YUNETAS_BASE-relative globs
+    ('modules/c/*'); registered projects come as absolute paths.
+    """
+    base_path = Path(YUNETAS_BASE)
+    if not base_path.is_dir():
+        print(f"[red]Error: YUNETAS_BASE '{YUNETAS_BASE}' does not exist or is not a directory.[/red]")
+        raise typer.Exit(code=1)
+
+    dir_paths = []
+    for directory in directories:
+        if os.path.isabs(directory):
+            path_pattern = Path(directory)
+        else:
+            path_pattern = base_path / directory
+        for dir_path in path_pattern.parent.glob(path_pattern.name):  # Support wildcard directories
+            if dir_path.is_dir():
+                dir_paths.append(dir_path)
+    return dir_paths
+
+
+CONFIGURE_FINGERPRINT = ".yunetas-configure.json"
+
+# The environment cmake reads when it first configures a build/: the generator
+# (when no -G is given), the compilers and their flags, and what newer cmakes
+# take as defaults for their -D's. Like the command line, a change here is one
+# cmake cannot apply in place.
+CONFIGURE_ENV = (
+    "CMAKE_GENERATOR", "CMAKE_GENERATOR_PLATFORM", "CMAKE_GENERATOR_TOOLSET",
+    "CC", "CXX", "CFLAGS", "CXXFLAGS", "LDFLAGS",
+    "CMAKE_C_COMPILER_LAUNCHER", "CMAKE_CXX_COMPILER_LAUNCHER",
+    "CMAKE_BUILD_TYPE", "CMAKE_TOOLCHAIN_FILE",
+)
+
+
+def configure_fingerprint(cmake_command):
+    """
+    What a build/ was configured from: the cmake command line (generator,
+    build type, compiler, launcher), the CONFIGURE_ENV variables that are set
+    and a digest of the SDK's .config.
+    """
+    try:
+        config_digest = load_kconfig(os.path.join(YUNETAS_BASE, ".config"))["digest"]
+    except OSError:
+        config_digest = None
+    env = {name: os.environ[name] for name in CONFIGURE_ENV if name in os.environ}
+    return {"cmake": list(cmake_command), "env": env, "config": config_digest}
+
+
+def configure_action(build_dir, fingerprint):
+    """
+    Decide how much of `build_dir` a new init has to redo.
+
+    Returns:
+        str: "wipe"     -- no usable build/, or the cmake command line or
+                           the environment it reads changed (generator, build
+                           type, compiler, launcher): cmake cannot switch
+                           those in place, start from scratch.
+             "refresh"  -- only .config changed: re-run cmake in the existing
+                           build/, so the objects survive and the next build
+                           recompiles what the change actually touches.
+             "skip"     -- configured from exactly these inputs already.
+    """
+    try:
+        with open(build_dir / CONFIGURE_FINGERPRINT) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        return "wipe"
+    if not isinstance(previous, dict) or previous.get("cmake") != fingerprint["cmake"]:
+        return "wipe"
+    if previous.get("env", {}) != fingerprint["env"]:
+        return "wipe"
+    if build_generator(build_dir) is None:
+        return "wipe"
+    if previous.get("config") != fingerprint["config"]:
+        return "refresh"
+    return "skip"
+
+
+def configure_directory(dir_path, cmake_command, capture=False, force=True):
+    """
+    Configure `dir_path`/build with cmake.
+
+    With force=True the build directory is always wiped and re-created. With
+    force=False it is reused according to configure_action(): left alone when
+    nothing changed, cmake re-run in place when only .config changed.
+
+    With capture=True nothing is printed: the progress lines and cmake's own
+    output are returned as one block, so that several directories configured
+    at the same time do not interleave their output line by line.
+
+    Returns:
+        tuple: (ok: bool, block: list) -- block is a list of (text, is_markup)
+        to hand to print_block(); empty when not capturing.
+    """
+    build_dir = dir_path / "build"
+    block = []
+
+    def say(msg):
+        if capture:
+            block.append((msg, True))
+        else:
+            print(msg)
+
+    fingerprint = configure_fingerprint(cmake_command)
+    action = "wipe" if force else configure_action(build_dir, fingerprint)
+    if action == "skip":
+        say(f"[dim]Configuration unchanged: {build_dir}[/dim]")
+        return True, block
+
+    try:
+        if action == "wipe":
+            # Remove build directory if it exists
+            if build_dir.exists():
+                say(f"[yellow]Removing existing build directory: {build_dir}[/yellow]")
+                subprocess.run(["rm", "-rf", str(build_dir)], check=True)
+
+            # Create a new build directory
+            say(f"[green]Creating build directory: {build_dir}[/green]")
+            build_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            say(f"[green].config changed, reconfiguring in place: {build_dir}[/green]")
+            # A failed cmake must not leave the old fingerprint claiming success.
+            try:
+                os.unlink(build_dir / CONFIGURE_FINGERPRINT)
+            except OSError:
+                pass
+
+        say(f"[blue]Running cmake command '{cmake_command}' in '{build_dir}'[/blue]")
+        rc, output = run_command(cmake_command, build_dir, capture)
+        if capture:
+            block.append((output, False))
+        if rc != 0:
+            raise subprocess.CalledProcessError(rc, cmake_command)
+
+        with open(build_dir / CONFIGURE_FINGERPRINT, "w") as f:
+            json.dump(fingerprint, f)
+
+    except (subprocess.CalledProcessError, OSError) as e:
+        say(f"[red]Error occurred while processing {dir_path}: {e}[/red]")
+        return False, block
+
+    return True, block
+
+
+def print_block(block):
+    """
+    Print a captured block: our own (rich markup) lines as usual, a tool's raw
+    output verbatim -- cmake and make print '[...]' freely, which rich would
+    otherwise try to read as markup.
+    """
+    for text, is_markup in block:
+        if is_markup:
+            print(text)
+        elif text:
+            console.print(text, markup=False, highlight=False)
+
+
+def process_directories(directories: List[str], jobs: int = 1, generator: Optional[str] = None,
+                        launcher: Optional[str] = None, force: bool = True):
     """
     Process directories and execute cmake with build type and detected compiler
 
     Args:
         directories (List[str]): List of directories to process.
+        jobs (int): How many directories to configure at the same time. With
+            more than one, each directory's output is captured and printed as
+            a single block when its cmake finishes.
+        generator (str|None): Key of GENERATORS: the build system cmake
+            writes. None passes no -G, leaving the choice to cmake (a
+            CMAKE_GENERATOR in the environment, else Unix Makefiles).
+        launcher (str|None): Compiler launcher (ccache/sccache) to compile
+            through, set as CMAKE_C_COMPILER_LAUNCHER.
+        force (bool): Wipe every build/ and configure from scratch. Without it
+            a build/ configured from the same inputs is kept (see
+            configure_action()).
 
     Returns:
         List of directories whose cmake failed. Empty means every one
@@ -1876,10 +2411,7 @@ def process_directories(directories: List[str]):
     """
     failed = []
 
-    base_path = Path(YUNETAS_BASE)
-    if not base_path.is_dir():
-        print(f"[red]Error: YUNETAS_BASE '{YUNETAS_BASE}' does not exist or is not a directory.[/red]")
-        raise typer.Exit(code=1)
+    dir_paths = expand_directories(directories)
 
     #--------------------------------------------------#
     #   Detect compiler from .config (Clang, GCC)
@@ -1903,90 +2435,735 @@ def process_directories(directories: List[str]):
         print(f"[red]Error: Compiler found [/red]")
         raise typer.Exit(code=1)
 
-    for directory in directories:
-        # Registered projects come as absolute paths; SDK entries are YUNETAS_BASE-relative
-        if os.path.isabs(directory):
-            path_pattern = Path(directory)
-        else:
-            path_pattern = base_path / directory
-        for dir_path in path_pattern.parent.glob(path_pattern.name):  # Support wildcard directories
-            if dir_path.is_dir():
-                print(f"[cyan]Processing directory: {dir_path}[/cyan]")
+    # Run cmake with build type and optional compiler
+    cmake_command = ["cmake"]
+    if generator:
+        cmake_command += ["-G", GENERATORS[generator][0]]
+    cmake_command += [
+        f"-DCMAKE_BUILD_TYPE={build_type}",
+        f"-DCMAKE_C_COMPILER={CC}",
+    ]
+    if launcher:
+        cmake_command.append(f"-DCMAKE_C_COMPILER_LAUNCHER={launcher}")
+    cmake_command.append("..")
+
+    jobs = min(resolve_jobs(jobs), len(dir_paths) or 1)
+    if jobs <= 1:
+        for dir_path in dir_paths:
+            print(f"[cyan]Processing directory: {dir_path}[/cyan]")
+            ok, _ = configure_directory(dir_path, cmake_command, force=force)
+            if not ok:
+                failed.append(dir_path)
+        return failed
+
+    #
+    #   The directories are independent at configure time, and nearly all of
+    #   cmake's time goes into probing the compiler again in each one, so they
+    #   are configured side by side. Threads are enough: the work happens in
+    #   the cmake children, the pool only waits for them.
+    #
+    print(f"[cyan]Configuring {len(dir_paths)} directories, {jobs} at a time[/cyan]")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(configure_directory, dir_path, cmake_command, True, force): dir_path
+            for dir_path in dir_paths
+        }
+        for future in as_completed(futures):
+            dir_path = futures[future]
+            ok, block = future.result()
+            print(f"[cyan]Processing directory: {dir_path}[/cyan]")
+            print_block(block)
+            if not ok:
+                failed.append(dir_path)
+
+    # Report failures in directory order, not in completion order.
+    return [d for d in dir_paths if d in failed]
+
+
+def check_generator(generator):
+    """
+    Exit unless `generator` is a known one and its build tool is installed.
+    """
+    if generator not in GENERATORS:
+        print(f"[red]Error: unknown generator '{generator}' "
+              f"(use one of: {', '.join(sorted(GENERATORS))}).[/red]")
+        raise typer.Exit(code=1)
+    tool = GENERATORS[generator][1]
+    if not shutil.which(tool):
+        print(f"[red]Error: '{tool}' not found in PATH (needed by --generator {generator}).[/red]")
+        raise typer.Exit(code=1)
 
-                build_dir = dir_path / "build"
 
-                try:
-                    # Remove build directory if it exists
-                    if build_dir.exists():
-                        print(f"[yellow]Removing existing build directory: {build_dir}[/yellow]")
-                        subprocess.run(["rm", "-rf", str(build_dir)], check=True)
+def build_generator(build_dir):
+    """
+    Which GENERATORS key a build/ directory was generated for, read from the
+    file its tool needs; None when it has neither (cmake never completed).
+    """
+    for name, (_, _, marker) in GENERATORS.items():
+        if (Path(build_dir) / marker).is_file():
+            return name
+    return None
 
-                    # Create a new build directory
-                    print(f"[green]Creating build directory: {build_dir}[/green]")
-                    build_dir.mkdir(parents=True, exist_ok=True)
 
-                    # Run cmake with build type and optional compiler
-                    cmake_command = [
-                        "cmake",
-                        f"-DCMAKE_BUILD_TYPE={build_type}",
-                        f"-DCMAKE_C_COMPILER={CC}",
-                    ]
-                    cmake_command.append("..")
+def driver_command(build_dir, command):
+    """
+    `command` as given by the callers (["make", "install"], ["make", "clean"])
+    translated to the tool `build_dir` was generated for. The targets are the
+    same under both: cmake's Ninja generator also writes 'install' and 'clean'.
+    """
+    if command and command[0] == "make":
+        tool = GENERATORS[build_generator(build_dir) or "make"][1]
+        return [tool] + list(command[1:])
+    return list(command)
 
-                    print(f"[blue]Running cmake command '{cmake_command}' in '{build_dir}'[/blue]")
-                    subprocess.run(cmake_command, cwd=build_dir, check=True)
 
-                except subprocess.CalledProcessError as e:
-                    print(f"[red]Error occurred while processing {dir_path}: {e}[/red]")
-                    failed.append(dir_path)
+def buildable_directories(directories: List[str], generator=None):
+    """
+    Expand `directories` and keep those ready for a build command: they have a
+    CMakeLists.txt and a build/ directory made by init. Prints why any other
+    one is skipped.
 
-    return failed
+    With `generator`, a build/ generated for another tool is an error: the
+    caller asked for that tool explicitly, and silently driving the other one
+    would hide that init has to be re-run.
+    """
+    dir_paths = []
+    for dir_path in expand_directories(directories):
+        cmake_file = dir_path / "CMakeLists.txt"
+        if not cmake_file.exists():
+            print(f"[yellow]Skipping {dir_path}: No CMakeLists.txt found[/yellow]")
+            continue
+        if not (dir_path / "build").is_dir():
+            print(f"[yellow]Skipping {dir_path}: No build directory found[/yellow]")
+            continue
+        if generator:
+            found = build_generator(dir_path / "build")
+            if found != generator:
+                print(f"[red]Error: '{dir_path / 'build'}' was generated for "
+                      f"{found or 'nothing (cmake did not complete)'}, not {generator}. "
+                      f"Run 'yunetas init --generator {generator}' first.[/red]")
+                raise typer.Exit(code=1)
+        dir_paths.append(dir_path)
+    return dir_paths
 
 
-def process_build_command(directories: List[str], command: List[str]):
+def process_build_command(directories: List[str], command: List[str], incremental=False,
+                          generator=None):
     """
     Process build commands (e.g., ["make", "install"], ["ninja", "clean"]) in specified directories.
 
     Args:
         directories (List[str]): List of directories to process.
         command (List[str]): The build command to execute as a list (e.g., ["make", "install"]).
+        incremental (bool): Skip the directories whose build manifest still
+            matches their inputs; the ones run are queued for
+            record_build_manifests().
+        generator (str|None): Require every build/ to be generated for this
+            GENERATORS key. A "make" command is always run with the tool each
+            build/ was generated for.
     """
 
     ret = 0
-    base_path = Path(YUNETAS_BASE)
-    if not base_path.is_dir():
-        print(f"[red]Error: YUNETAS_BASE '{YUNETAS_BASE}' does not exist or is not a directory.[/red]")
-        raise typer.Exit(code=1)
+    for dir_path in buildable_directories(directories, generator):
+        build_dir = dir_path / "build"
+        if incremental and is_build_current(dir_path):
+            print(f"[dim]Up to date: {build_dir}[/dim]")
+            settled_directories.append(dir_path)
+            continue
+        print(f"[cyan]Processing build directory: {build_dir}[/cyan]")
+        forget_build_manifest(dir_path)
+        dir_command = driver_command(build_dir, command)
+        try:
+            # Execute the specified build command
+            print(f"[blue]Running '{' '.join(dir_command)}' in {build_dir}[/blue]")
+            try:
+                rc, _ = run_command(dir_command, build_dir)
+            finally:
+                forget_sdk_output_stamps()
+            if rc != 0:
+                raise subprocess.CalledProcessError(rc, dir_command)
+            if incremental:
+                settled_directories.append(dir_path)
+        except subprocess.CalledProcessError as e:
+            print(f"[red]Error occurred while running '{' '.join(dir_command)}' in {build_dir}: {e}[/red]")
+            # typer.Exit, not the bare `exit()`: that one is installed
+            # by `site` and is absent under `python -S`, and it exits
+            # 255 instead of a plain 1.
+            raise typer.Exit(code=1)
 
-    for directory in directories:
-        # Registered projects come as absolute paths; SDK entries are YUNETAS_BASE-relative
-        if os.path.isabs(directory):
-            path_pattern = Path(directory)
+    return ret
+
+
+#--------------------------------------------------#
+#   Build manifests (incremental build)
+#
+#   A `make install` that has nothing to do still costs a make start and a
+#   dependency scan per directory, tens of seconds over the whole SDK. After a
+#   successful build every directory gets a manifest in its build/: one digest
+#   over the size and mtime of its inputs. `build` skips a directory whose
+#   manifest still matches.
+#
+#   The inputs are the directory's own tree (sources, CMakeLists.txt), its
+#   CMakeCache.txt, and what it consumes from the SDK: outputs/include (which
+#   holds the generated yuneta_config.h/yuneta_version.h), outputs/lib and
+#   outputs_ext/lib. The files the directory installs itself (its
+#   install_manifest.txt) are left out, or its own install would invalidate it.
+#
+#   Running any build command in a directory drops its manifest first, so a
+#   clean, or a build that fails halfway, never leaves a stale "up to date".
+#--------------------------------------------------#
+BUILD_MANIFEST = ".yunetas-manifest.json"
+
+# Directories this run built or found up to date. Their manifests are
+# (re)written by record_build_manifests() once the whole build has succeeded:
+# recording one as soon as it is built would capture an outputs/lib that later
+# directories are still changing, and an up-to-date one must be re-recorded
+# too, or the libraries its downstream just reinstalled would make it look
+# stale on the next run. Dependency order makes that safe: anything a
+# directory consumes was installed before it was checked.
+settled_directories = []
+
+# Stamps of the shared SDK outputs, computed once and dropped whenever a build
+# command runs (it may have installed something).
+_output_stamps = None
+
+
+def _stat_tree(root, prefix, out, skip=frozenset()):
+    """
+    Append (relative path, size, mtime_ns) for every file under `root`,
+    leaving out the directories whose paths are in `skip`.
+    """
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        rel = f"{prefix}/{entry.name}" if prefix else entry.name
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path in skip:
+                    continue
+                _stat_tree(entry.path, rel, out, skip)
+            elif entry.is_file():
+                st = entry.stat()
+                out.append((rel, st.st_size, st.st_mtime_ns))
+        except OSError:
+            continue
+
+
+def sdk_output_stamps():
+    """Stamps of outputs/include, outputs/lib and outputs_ext/lib."""
+    global _output_stamps
+    if _output_stamps is None:
+        stamps = []
+        for sub in ("outputs/include", "outputs/lib", "outputs_ext/lib"):
+            _stat_tree(os.path.join(YUNETAS_BASE, sub), sub, stamps)
+        _output_stamps = stamps
+    return _output_stamps
+
+
+def forget_sdk_output_stamps():
+    global _output_stamps
+    _output_stamps = None
+
+
+_ADD_SUBDIRECTORY_RE = re.compile(r"^\s*add_subdirectory\s*\(\s*\"?([^\s\")]+)", re.M | re.I)
+
+
+def _stat_sources(dir_path, stamps):
+    """
+    Append the stamps of the sources a build in `dir_path` compiles.
+
+    A directory's sources are its whole tree but its build/ (a source
+    subdirectory that happens to be named "build" is walked), except for the
+    SDK root (the "." entry, which is what `test` builds): its tree is every
+    other SDK directory plus outputs/. There, only its own top-level files and
+    the subdirectories its CMakeLists.txt adds are walked; when one of those
+    is named through a cmake variable the whole tree is, as elsewhere. Under
+    the root, the build/ of every SDK directory is left out too.
+    """
+    dir_path = os.path.realpath(str(dir_path))
+    skip = {os.path.join(dir_path, "build")}
+    if dir_path != os.path.realpath(YUNETAS_BASE):
+        _stat_tree(dir_path, "", stamps, skip)
+        return
+    skip.update(
+        os.path.join(os.path.realpath(str(d)), "build") for d in expand_directories(DIRECTORIES))
+    try:
+        with open(os.path.join(dir_path, "CMakeLists.txt"), errors="replace") as f:
+            subdirs = _ADD_SUBDIRECTORY_RE.findall(f.read())
+    except OSError:
+        subdirs = []
+    if any("$" in sub for sub in subdirs):
+        _stat_tree(dir_path, "", stamps, skip)
+        return
+    try:
+        entries = list(os.scandir(dir_path))
+    except OSError:
+        entries = []
+    for entry in entries:
+        try:
+            if not entry.name.startswith(".") and entry.is_file():
+                st = entry.stat()
+                stamps.append((entry.name, st.st_size, st.st_mtime_ns))
+        except OSError:
+            continue
+    for sub in subdirs:
+        sub = os.path.normpath(sub)
+        _stat_tree(os.path.join(dir_path, sub), sub, stamps, skip)
+
+
+def build_inputs_fingerprint(dir_path):
+    """
+    Digest of everything a `make install` in `dir_path` depends on.
+    """
+    build_dir = Path(dir_path) / "build"
+    own = set()
+    try:
+        with open(build_dir / "install_manifest.txt") as f:
+            own = {line.strip() for line in f if line.strip()}
+    except OSError:
+        pass
+
+    stamps = []
+    _stat_sources(dir_path, stamps)
+    cache = build_dir / "CMakeCache.txt"
+    if cache.is_file():
+        st = cache.stat()
+        stamps.append(("build/CMakeCache.txt", st.st_size, st.st_mtime_ns))
+    for rel, size, mtime_ns in sdk_output_stamps():
+        if os.path.join(YUNETAS_BASE, rel) not in own:
+            stamps.append(("$" + rel, size, mtime_ns))
+
+    digest = hashlib.sha256()
+    for rel, size, mtime_ns in sorted(stamps):
+        digest.update(f"{rel}\0{size}\0{mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def is_build_current(dir_path):
+    """True when `dir_path` has a manifest and its inputs still match it."""
+    try:
+        with open(Path(dir_path) / "build" / BUILD_MANIFEST) as f:
+            recorded = json.load(f).get("inputs")
+    except (OSError, ValueError, AttributeError):
+        return False
+    return recorded == build_inputs_fingerprint(dir_path)
+
+
+def forget_build_manifest(dir_path):
+    try:
+        os.unlink(Path(dir_path) / "build" / BUILD_MANIFEST)
+    except OSError:
+        pass
+
+
+def record_build_manifests():
+    """
+    Write the manifest of every directory this run built or found up to date.
+    Called only after the whole build succeeded.
+    """
+    forget_sdk_output_stamps()
+    for dir_path in settled_directories:
+        manifest = {"inputs": build_inputs_fingerprint(dir_path)}
+        try:
+            with open(Path(dir_path) / "build" / BUILD_MANIFEST, "w") as f:
+                json.dump(manifest, f)
+                f.write("\n")
+        except OSError as e:
+            print(f"[yellow]Warning: cannot write the build manifest of {dir_path}: {e}[/yellow]")
+    del settled_directories[:]
+
+
+#--------------------------------------------------#
+#   Compiler cache
+#
+#   `init --ccache` compiles through ccache (or sccache) by setting
+#   CMAKE_C_COMPILER_LAUNCHER. init wipes build/, so without it every re-init
+#   is a cold compile of the whole SDK; with it, a CI that rebuilds the same
+#   tree across branches mostly reads objects back from the cache.
+#
+#   `build` finds the launcher in the CMakeCache.txt of the build dirs, so it
+#   needs no flag of its own, and reports the hits and misses of the run.
+#--------------------------------------------------#
+COMPILER_LAUNCHERS = ["ccache", "sccache"]
+
+_LAUNCHER_RE = re.compile(r"^CMAKE_C_COMPILER_LAUNCHER:[A-Z]+=(.+)$", re.MULTILINE)
+
+
+def find_compiler_launcher():
+    """Path of the first compiler cache found in PATH, or None."""
+    for name in COMPILER_LAUNCHERS:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def configured_launchers(dir_paths):
+    """The compiler launchers the build/ of `dir_paths` were configured with."""
+    launchers = set()
+    for dir_path in dir_paths:
+        try:
+            with open(Path(dir_path) / "build" / "CMakeCache.txt") as f:
+                m = _LAUNCHER_RE.search(f.read())
+        except OSError:
+            continue
+        if m and m.group(1).strip():
+            launchers.add(m.group(1).strip())
+    return sorted(launchers)
+
+
+def compiler_cache_stats(launcher):
+    """
+    Cumulative (hits, misses) of a compiler cache, or None if its statistics
+    cannot be read.
+
+    ccache --print-stats is machine-readable (key<TAB>value). The key names
+    changed in ccache 4; both sets are accepted. sccache reports JSON, with
+    its counts split per language.
+    """
+    name = os.path.basename(launcher)
+    try:
+        if name.startswith("sccache"):
+            res = subprocess.run([launcher, "--show-stats", "--stats-format", "json"],
+                                 capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
+            stats = json.loads(res.stdout).get("stats", {})
+            hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+            misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+            return hits, misses
+        res = subprocess.run([launcher, "--print-stats"],
+                             capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=30)
+    except (OSError, subprocess.SubprocessError, ValueError, AttributeError):
+        return None
+    if res.returncode != 0:
+        return None
+    counters = {}
+    for line in res.stdout.splitlines():
+        key, _, value = line.partition("\t")
+        if value.strip().isdigit():
+            counters[key.strip()] = int(value)
+    hits = sum(counters.get(k, 0) for k in (
+        "direct_cache_hit", "preprocessed_cache_hit",        # ccache 4
+        "cache_hit_direct", "cache_hit_preprocessed",        # ccache 3
+    ))
+    misses = counters.get("cache_miss", 0)
+    return hits, misses
+
+
+def snapshot_compiler_caches(dir_paths):
+    """{launcher: (hits, misses)} before a build, for report_compiler_caches()."""
+    before = {}
+    for launcher in configured_launchers(dir_paths):
+        stats = compiler_cache_stats(launcher)
+        if stats is not None:
+            before[launcher] = stats
+    return before
+
+
+def report_compiler_caches(before):
+    """Append the hits and misses of this run, per launcher, to the recap."""
+    for launcher, (hits0, misses0) in sorted(before.items()):
+        after = compiler_cache_stats(launcher)
+        if after is None:
+            continue
+        hits, misses = after[0] - hits0, after[1] - misses0
+        total = hits + misses
+        rate = f"{100.0 * hits / total:.1f}% hit rate" if total else "nothing compiled"
+        final_messages.append(
+            f"[yellow]Compiler cache[/yellow] ({os.path.basename(launcher)}): "
+            f"{hits} hit(s), {misses} miss(es), {rate}"
+        )
+
+
+#--------------------------------------------------#
+#   Build profile
+#
+#   `--profile` on init/build/clean/test records every cmake/make/ninja/ctest
+#   this CLI starts: wall time, and from wait4() the CPU time and peak RSS of
+#   the tool together with everything it waited for (the compilers make runs).
+#   When the command ends it prints the runs sorted by wall time, the critical
+#   path, and writes a Chrome trace (yunetas-profile-<time>.json, in the
+#   current directory) to open in chrome://tracing or ui.perfetto.dev.
+#--------------------------------------------------#
+# Records of the tools run by this command; None while not profiling.
+profile_records = None
+_profile_origin = 0.0
+
+
+def start_profile(command_name):
+    """Record every tool run from here on; report when the command exits."""
+    global profile_records, _profile_origin
+    profile_records = []
+    _profile_origin = time.monotonic()
+    # atexit: the report is wanted after a failed build too, and typer.Exit
+    # leaves through SystemExit.
+    atexit.register(report_profile, command_name)
+
+
+def run_command(command, cwd, capture=False):
+    """
+    Run a build tool in `cwd`: cmake, make, ninja or ctest.
+
+    With capture=True stdin is closed and stdout+stderr are returned as one
+    stream; otherwise the tool writes straight to the terminal.
+
+    Returns:
+        tuple: (returncode, output) -- output is "" when not capturing.
+    """
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        command, cwd=cwd, text=True,
+        stdin=subprocess.DEVNULL if capture else None,
+        stdout=subprocess.PIPE if capture else None,
+        stderr=subprocess.STDOUT if capture else None,
+    )
+    output = ""
+    try:
+        if capture:
+            output = proc.stdout.read().rstrip("\n")
+            proc.stdout.close()
+        if profile_records is None:
+            return proc.wait(), output
+        # wait4() reaps like wait() does, and also returns the rusage.
+        _, status, usage = os.wait4(proc.pid, 0)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    end = time.monotonic()
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    profile_records.append({
+        "tool": os.path.basename(command[0]),
+        "cmd": " ".join(str(c) for c in command),
+        "dir": str(cwd),
+        "start": start - _profile_origin,
+        "end": end - _profile_origin,
+        "cpu": usage.ru_utime + usage.ru_stime,
+        "maxrss_kb": usage.ru_maxrss,
+        "rc": proc.returncode,
+    })
+    return proc.returncode, output
+
+
+def profile_critical_path(records):
+    """
+    The chain of runs that bounded the wall time: from the run that ended
+    last, step back each time to the run that ended latest before this one
+    started. In a dependency-ordered build that predecessor is what it was
+    waiting for; in a serial run the path is every run.
+    """
+    path = []
+    remaining = sorted(records, key=lambda r: r["end"])
+    current = remaining[-1] if remaining else None
+    while current is not None:
+        path.append(current)
+        # 1ms of slack: the next run starts right after the previous one ends.
+        before = [r for r in remaining if r["end"] <= current["start"] + 0.001 and r is not current]
+        current = before[-1] if before else None
+        remaining = before
+    path.reverse()
+    return path
+
+
+def write_profile_trace(records, command_name):
+    """Write the runs as a Chrome trace file; return its name."""
+    lanes_end = []
+    events = []
+    for r in sorted(records, key=lambda r: r["start"]):
+        # Runs that overlapped in time go on separate lanes (trace "threads").
+        for lane, lane_end in enumerate(lanes_end):
+            if lane_end <= r["start"]:
+                break
         else:
-            path_pattern = base_path / directory
-        for dir_path in path_pattern.parent.glob(path_pattern.name):  # Support wildcard directories
-            if not dir_path.is_dir():
-                continue
+            lane = len(lanes_end)
+            lanes_end.append(0.0)
+        lanes_end[lane] = r["end"]
+        events.append({
+            "name": f"{r['tool']} {r['dir']}",
+            "cat": r["tool"],
+            "ph": "X",
+            "ts": int(r["start"] * 1e6),
+            "dur": int((r["end"] - r["start"]) * 1e6),
+            "pid": 1,
+            "tid": lane,
+            "args": {
+                "cmd": r["cmd"],
+                "dir": r["dir"],
+                "cpu_s": round(r["cpu"], 3),
+                "maxrss_kb": r["maxrss_kb"],
+                "rc": r["rc"],
+            },
+        })
+    filename = "yunetas-profile-%s-%s.json" % (
+        command_name, datetime.now().isoformat(timespec="seconds").replace(":", "-"))
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, indent=1)
+    return filename
+
+
+def report_profile(command_name):
+    """Print the profile of this command and write its trace."""
+    records = profile_records or []
+    if not records:
+        print("[dim]Profile: no build tool was run.[/dim]")
+        return
 
-            cmake_file = dir_path / "CMakeLists.txt"
-            if not cmake_file.exists():
-                print(f"[yellow]Skipping {dir_path}: No CMakeLists.txt found[/yellow]")
-                continue
+    def where(r):
+        rel = os.path.relpath(r["dir"], YUNETAS_BASE)
+        return r["dir"] if rel.startswith("..") else rel
 
-            build_dir = dir_path / "build"
-            if build_dir.is_dir():
-                print(f"[cyan]Processing build directory: {build_dir}[/cyan]")
-                try:
-                    # Execute the specified build command
-                    print(f"[blue]Running '{' '.join(command)}' in {build_dir}[/blue]")
-                    subprocess.run(command, cwd=build_dir, check=True) #, env=env)
-                except subprocess.CalledProcessError as e:
-                    print(f"[red]Error occurred while running '{' '.join(command)}' in {build_dir}: {e}[/red]")
-                    # typer.Exit, not the bare `exit()`: that one is installed
-                    # by `site` and is absent under `python -S`, and it exits
-                    # 255 instead of a plain 1.
-                    raise typer.Exit(code=1)
-            else:
-                print(f"[yellow]Skipping {dir_path}: No build directory found[/yellow]")
+    total = max(r["end"] for r in records) - min(r["start"] for r in records)
+    print(f"\n[bold]Profile[/bold] ({len(records)} runs, {total:.1f}s wall)")
+    print(f"  {'wall s':>8} {'cpu s':>8} {'rss MB':>8}  {'tool':<6} directory")
+    for r in sorted(records, key=lambda r: r["end"] - r["start"], reverse=True):
+        mark = "" if r["rc"] == 0 else f"  [red](exit {r['rc']})[/red]"
+        print(f"  {r['end'] - r['start']:>8.2f} {r['cpu']:>8.2f} {r['maxrss_kb'] / 1024:>8.1f}  "
+              f"{r['tool']:<6} {where(r)}{mark}")
 
-    return ret
+    path = profile_critical_path(records)
+    busy = sum(r["end"] - r["start"] for r in path)
+    print(f"\n[bold]Critical path[/bold] ({busy:.1f}s of {total:.1f}s)")
+    for r in path:
+        print(f"  {r['start']:>8.2f} +{r['end'] - r['start']:<8.2f} {r['tool']:<6} {where(r)}")
+
+    try:
+        filename = write_profile_trace(records, command_name)
+        print(f"\n[yellow]Trace[/yellow]: [blue]{filename}[/blue] (chrome://tracing, ui.perfetto.dev)")
+    except OSError as e:
+        print(f"[red]Error: cannot write the profile trace: {e}[/red]")
+
+
+#--------------------------------------------------#
+#   Parallel build scheduler
+#
+#   BUILD_LAYERS gives the order in which the SDK links against itself. A
+#   directory may start once every directory of the layer before it has
+#   installed; the directories of one layer build side by side. Registered
+#   projects only link against the SDK libraries, so they start as soon as the
+#   last library layer is installed, next to utils/yunos/stress/performance.
+#
+#   Every running make gets a share of one global budget of --jobs CPUs
+#   (`make -jK`), so a lone gobj-c uses the whole machine and twenty utilities
+#   building at once do not each spawn one job per core.
+#--------------------------------------------------#
+def build_graph(include_sdk, projects, generator=None):
+    """
+    The build nodes, in start order: [{"name", "dir", "deps"}], where "deps"
+    holds the indexes of the nodes that must be installed first.
+    """
+    nodes = []
+    previous = set()    # nodes of the last non-empty layer
+    libraries = set()   # what a registered project waits for
+
+    if include_sdk:
+        for n, layer in enumerate(BUILD_LAYERS):
+            current = set()
+            for dir_path in buildable_directories(layer, generator):
+                current.add(len(nodes))
+                nodes.append({"name": str(dir_path), "dir": dir_path, "deps": set(previous)})
+            if current:
+                previous = current
+            if n < SDK_LIBRARY_LAYERS:
+                libraries = set(previous)
+
+    for project in projects:
+        for dir_path in buildable_directories([project_yunos_dir(project)], generator):
+            nodes.append({"name": project["name"], "dir": dir_path, "deps": set(libraries)})
+    return nodes
+
+
+def with_parallelism(command, share):
+    """
+    `command` with the build tool's -jK added; other tools are left as they
+    are. Ninja gets it even for K=1: left alone it starts one job per core,
+    which would blow the budget the scheduler is sharing out.
+    """
+    if command and command[0] == "make" and share > 1:
+        return [command[0], f"-j{share}"] + list(command[1:])
+    if command and command[0] == "ninja":
+        return [command[0], f"-j{share}"] + list(command[1:])
+    return list(command)
+
+
+def run_captured(command, cwd):
+    """
+    Run `command` in `cwd`, capturing stdout and stderr as one stream.
+
+    Returns:
+        tuple: (returncode, output)
+    """
+    return run_command(command, cwd, capture=True)
+
+
+def run_build_graph(nodes, command, jobs, incremental=False):
+    """
+    Run `command` in the build/ of every node, each one as soon as its deps
+    are done, within a budget of `jobs` CPUs. Output is captured per node and
+    printed as one block when the node finishes.
+
+    With `incremental`, a node whose build manifest still matches is done
+    without running anything. That is decided when the node becomes ready,
+    not up front: by then its deps have installed, and whatever they changed
+    is part of its inputs.
+
+    After a failure nothing new is started; the builds already running are
+    allowed to finish, so their output is not lost.
+
+    Returns:
+        list: the nodes that failed (empty on success).
+    """
+    jobs = resolve_jobs(jobs)
+    pending = list(range(len(nodes)))
+    done = set()
+    failed = []
+    running = {}    # future -> (node index, cpu share, command run)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            ready = [] if failed else [i for i in pending if nodes[i]["deps"] <= done]
+            if incremental:
+                current = [i for i in ready if is_build_current(nodes[i]["dir"])]
+                for i in current:
+                    print(f"[dim]Up to date: {nodes[i]['dir'] / 'build'}[/dim]")
+                    settled_directories.append(nodes[i]["dir"])
+                    pending.remove(i)
+                    done.add(i)
+                if current:
+                    continue    # may have made other nodes ready
+            available = jobs - sum(share for _, share, _ in running.values())
+            starting = ready[:max(0, available)]
+            for k, i in enumerate(starting):
+                share = available // len(starting) + (1 if k < available % len(starting) else 0)
+                build_dir = nodes[i]["dir"] / "build"
+                cmd = with_parallelism(driver_command(build_dir, command), share)
+                forget_build_manifest(nodes[i]["dir"])
+                print(f"[blue]Running '{' '.join(cmd)}' in {build_dir}[/blue]")
+                running[pool.submit(run_captured, cmd, build_dir)] = (i, share, cmd)
+                pending.remove(i)
+
+            if not running:
+                break   # a failure stopped the scheduling
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i, _, cmd = running.pop(future)
+                returncode, output = future.result()
+                forget_sdk_output_stamps()
+                build_dir = nodes[i]["dir"] / "build"
+                print(f"[cyan]Processing build directory: {build_dir}[/cyan]")
+                print_block([(output, False)])
+                if returncode == 0:
+                    done.add(i)
+                    if incremental:
+                        settled_directories.append(nodes[i]["dir"])
+                else:
+                    print(f"[red]Error occurred while running '{' '.join(cmd)}' in "
+                          f"{build_dir}: exit status {returncode}[/red]")
+                    failed.append(i)
+
+    return [nodes[i] for i in failed]